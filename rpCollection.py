@@ -0,0 +1,1057 @@
+"""rpCollection
+.. moduleauthor:: Melchior du Lac
+"""
+
+
+import io
+import os
+import re
+import csv
+import gzip
+import math
+import time
+import queue
+import heapq
+import itertools
+import tarfile
+import logging
+import threading
+import libsbml
+import concurrent.futures
+import pandas as pd
+import rpSBML
+import rpGraph
+import rpInterchange
+import rpFBA
+
+
+## @package rpCollection
+# Functions that apply the rpSBML and rpGraph tools to collections of pathways
+#
+# A collection is either a directory or a (compressed) tar archive of rpSBML files, as returned by the
+# different tools of the workflow. The files are processed in worker processes and the results are streamed back
+# as soon as they are available.
+
+
+logger = logging.getLogger(__name__)
+
+
+SBML_EXTENSIONS = ('.xml', '.sbml')
+
+
+def _modelName(file_name):
+    """Private function that returns the name of a model from its file name
+
+    :param file_name: The name of the file
+
+    :type file_name: str
+
+    :return: The name of the file without the directory and the extension
+    :rtype: str
+    """
+    name = os.path.basename(file_name)
+    for ext in SBML_EXTENSIONS:
+        if name.endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def iterCollection(path, extensions=SBML_EXTENSIONS):
+    """Iterate the rpSBML files of a collection
+
+    The files are read one at a time so that the collection is never held in memory
+
+    :param path: Path to a directory, a tar archive (compressed or not) or a single SBML file
+    :param extensions: The extensions of the files to return (Default: ('.xml', '.sbml'))
+
+    :type path: str
+    :type extensions: tuple
+
+    :raises FileNotFoundError: If the path does not exist
+
+    :return: Generator of tuples of the name of the model and the content of the file
+    :rtype: generator
+    """
+    if os.path.isdir(path):
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(extensions):
+                with open(os.path.join(path, file_name), 'rb') as in_file:
+                    yield _modelName(file_name), in_file.read()
+    elif os.path.isfile(path) and tarfile.is_tarfile(path):
+        with tarfile.open(path, mode='r|*') as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(extensions):
+                    yield _modelName(member.name), tar.extractfile(member).read()
+    elif os.path.isfile(path):
+        with open(path, 'rb') as in_file:
+            yield _modelName(path), in_file.read()
+    else:
+        logger.error('The collection path does not exist: '+str(path))
+        raise FileNotFoundError
+
+
+def boundedMap(func, iterable, num_workers=None, max_pending=None):
+    """Apply a function to the items of an iterable in worker processes and yield the results as they complete
+
+    Contrary to multiprocessing.Pool.imap, at most max_pending items are read from the iterable ahead of the
+    results, so that memory stays bounded for large collections. The results are not returned in the input order.
+    If num_workers is 1, the function is applied in the current process
+
+    :param func: Picklable function that takes a single item
+    :param iterable: The items to process
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+    :param max_pending: The maximal number of items submitted and not returned (Default: None, 4 times the number of workers)
+
+    :type func: function
+    :type iterable: iterable
+    :type num_workers: int
+    :type max_pending: int
+
+    :return: Generator of the results of the function
+    :rtype: generator
+    """
+    if num_workers==1:
+        for item in iterable:
+            yield func(item)
+        return
+    if not num_workers:
+        num_workers = os.cpu_count() or 1
+    if not max_pending:
+        max_pending = 4*num_workers
+    with concurrent.futures.ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = set()
+        for item in iterable:
+            pending.add(executor.submit(func, item))
+            if len(pending)>=max_pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in concurrent.futures.as_completed(pending):
+            yield future.result()
+
+
+def readCollectionModel(name, content):
+    """Return the rpSBML object of a file of the collection
+
+    :param name: The name of the model
+    :param content: The content of the SBML file
+
+    :type name: str
+    :type content: bytes
+
+    :return: The rpSBML object
+    :rtype: rpSBML
+    """
+    rpsbml = rpSBML.rpSBML(name)
+    rpsbml.readSBMLString(content)
+    return rpsbml
+
+
+##########################################################################
+############################## ORDER #####################################
+##########################################################################
+
+
+def _orderPathway(args):
+    """Private worker function that orders the reactions of a pathway
+
+    :param args: Tuple of the name and content of the file, the pathway id and the central species group id
+
+    :type args: tuple
+
+    :return: Dictionnary of the row of the pathway
+    :rtype: dict
+    """
+    (name, content), pathway_id, species_group_id = args
+    row = {'pathway': name, 'ordered_reactions': None, 'sources': None, 'sinks': None, 'error': None}
+    try:
+        rpgraph = rpGraph.rpGraph(readCollectionModel(name, content), pathway_id, species_group_id)
+        row['ordered_reactions'] = rpgraph.orderedRetroReactions()
+        row['sources'] = rpgraph.sources()
+        row['sinks'] = rpgraph.sinks()
+        if not row['ordered_reactions']:
+            row['error'] = 'Could not order the reactions'
+    except Exception as e:
+        row['error'] = repr(e)
+    return row
+
+
+def iterOrderedReactions(path, pathway_id='rp_pathway', species_group_id='central_species', num_workers=None):
+    """Order the reactions of all the pathways of a collection
+
+    Each pathway is read and ordered in a worker process and the results are yielded as they are computed.
+    Pathways that cannot be read or ordered are returned with a description of the problem in the error field
+
+    :param path: Path to the collection (directory or tar archive)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param species_group_id: The id of the central species (Default: central_species)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type pathway_id: str
+    :type species_group_id: str
+    :type num_workers: int
+
+    :return: Generator of dictionnaries with the keys: pathway, ordered_reactions, sources, sinks, error
+    :rtype: generator
+    """
+    tasks = ((item, pathway_id, species_group_id) for item in iterCollection(path))
+    for row in boundedMap(_orderPathway, tasks, num_workers):
+        if row['error']:
+            logger.warning('Cannot order the pathway '+str(row['pathway'])+': '+str(row['error']))
+        yield row
+
+
+def orderedReactionsTable(path, pathway_id='rp_pathway', species_group_id='central_species', num_workers=None):
+    """Return the table of the ordered reactions, source and sink species of all the pathways of a collection
+
+    :param path: Path to the collection (directory or tar archive)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param species_group_id: The id of the central species (Default: central_species)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type pathway_id: str
+    :type species_group_id: str
+    :type num_workers: int
+
+    :return: Table with one row per pathway
+    :rtype: pandas.DataFrame
+    """
+    rows = list(iterOrderedReactions(path, pathway_id, species_group_id, num_workers))
+    table = pd.DataFrame(rows, columns=['pathway', 'ordered_reactions', 'sources', 'sinks', 'error'])
+    return table.sort_values('pathway').reset_index(drop=True)
+
+
+##########################################################################
+############################## EXPORT ####################################
+##########################################################################
+
+
+def _genJSONLine(args):
+    """Private worker function that returns the JSON line of the annotations of a pathway
+
+    :param args: Tuple of the name and content of the file and the pathway id
+
+    :type args: tuple
+
+    :return: Tuple of the name of the pathway, the encoded line and the error if the pathway cannot be read
+    :rtype: tuple
+    """
+    (name, content), pathway_id = args
+    try:
+        row = {'name': name}
+        row.update(readCollectionModel(name, content).genJSON(pathway_id))
+        error = None
+    except Exception as e:
+        row = {'name': name, 'error': repr(e)}
+        error = repr(e)
+    return name, rpInterchange.dumps(row, 'json')+b'\n', error
+
+
+def writeJSONLines(path, out_path, pathway_id='rp_pathway', num_workers=None):
+    """Write the genJSON annotations of all the pathways of a collection as newline delimited JSON
+
+    Each pathway is read and encoded in a worker process (using orjson if it is installed) and the lines are
+    written as they are returned, so that neither the collection nor the output are held in memory. The lines are
+    dictionnaries with the name of the model (name) and the content of rpSBML.genJSON. Pathways that
+    cannot be read are written with a description of the problem in the error field
+
+    :param path: Path to the collection (directory or tar archive)
+    :param out_path: Path to the output file, or a file object opened in binary mode
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type out_path: Union[str, file]
+    :type pathway_id: str
+    :type num_workers: int
+
+    :return: The number of pathways written
+    :rtype: int
+    """
+    if isinstance(out_path, str):
+        with open(out_path, 'wb') as out_file:
+            return writeJSONLines(path, out_file, pathway_id, num_workers)
+    count = 0
+    tasks = ((item, pathway_id) for item in iterCollection(path))
+    for name, line, error in boundedMap(_genJSONLine, tasks, num_workers):
+        if error:
+            logger.warning('Cannot export the pathway '+str(name)+': '+str(error))
+        out_path.write(line)
+        count += 1
+    return count
+
+
+def _scoreRows(args):
+    """Private worker function that returns the numeric BRSynth annotations of a pathway and of its reactions
+
+    :param args: Tuple of the name and content of the file and the pathway id
+
+    :type args: tuple
+
+    :return: Tuple of the name of the pathway, the list of rows and the error if the pathway cannot be read
+    :rtype: tuple
+    """
+    (name, content), pathway_id = args
+    try:
+        rpsbml = readCollectionModel(name, content)
+        groups = rpsbml.model.getPlugin('groups')
+        rows = [_scoreRow(rpsbml, groups.getGroup(pathway_id), name, 'pathway', None)]
+        for reaction_id in rpsbml.readRPpathwayIDs(pathway_id):
+            rows.append(_scoreRow(rpsbml, rpsbml.model.getReaction(reaction_id), name, 'reaction', reaction_id))
+        return name, rows, None
+    except Exception as e:
+        return name, [], repr(e)
+
+
+def _scoreRow(rpsbml, sbase, name, level, reaction_id):
+    """Private function that returns the row of the numeric BRSynth annotations of a libSBML object
+
+    :param rpsbml: The rpSBML object
+    :param sbase: The annotated libSBML object (group or reaction)
+    :param name: The name of the pathway
+    :param level: The level of the row (pathway or reaction)
+    :param reaction_id: The id of the reaction (None for the pathway)
+
+    :type rpsbml: rpSBML
+    :type sbase: libsbml.SBase
+    :type name: str
+    :type level: str
+    :type reaction_id: str
+
+    :return: Dictionnary of the row, with the units in the <name>_units columns
+    :rtype: dict
+    """
+    row = {'pathway': name, 'level': level, 'reaction_id': reaction_id}
+    for key, value in rpsbml.readBRSYNTHAnnotation(sbase.getAnnotation()).items():
+        if not isinstance(value, dict) or not 'value' in value:
+            continue
+        if isinstance(value['value'], bool) or not isinstance(value['value'], (int, float)):
+            continue
+        row[key] = value['value']
+        if value.get('units'):
+            row[key+'_units'] = value['units']
+    return row
+
+
+def scoresTable(path, pathway_id='rp_pathway', num_workers=None):
+    """Return the table of the numeric annotations of all the pathways of a collection and of their reactions
+
+    The table has one row per pathway (level is pathway) and one row per reaction of the pathway (level is reaction)
+    with one typed column per numeric BRSynth annotation (ex: global_score, norm_*, dfG_prime_m, dfG_uncert, fba_*).
+    The units of an annotation are given in the <annotation>_units column
+
+    :param path: Path to the collection (directory or tar archive)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type pathway_id: str
+    :type num_workers: int
+
+    :return: Table with one row per pathway and per reaction
+    :rtype: pandas.DataFrame
+    """
+    rows = []
+    tasks = ((item, pathway_id) for item in iterCollection(path))
+    for name, pathway_rows, error in boundedMap(_scoreRows, tasks, num_workers):
+        if error:
+            logger.warning('Cannot read the scores of the pathway '+str(name)+': '+str(error))
+        rows += pathway_rows
+    table = pd.DataFrame(rows, columns=['pathway', 'level', 'reaction_id']+sorted(set([y for i in rows for y in i])-set(['pathway', 'level', 'reaction_id'])))
+    for column in table.columns:
+        if column in ['pathway', 'level', 'reaction_id'] or column.endswith('_units'):
+            table[column] = table[column].astype('category')
+        elif column in ['path_id', 'step_id', 'sub_step_id']:
+            table[column] = table[column].astype('Int64')
+        else:
+            table[column] = table[column].astype('float64')
+    return table.sort_values(['pathway', 'level', 'reaction_id']).reset_index(drop=True)
+
+
+def writeScoresTable(path, out_path, pathway_id='rp_pathway', num_workers=None):
+    """Write the table of the numeric annotations of all the pathways of a collection in a columnar format
+
+    The format is given by the extension of the output file: Parquet (.parquet), Arrow IPC (.arrow or .feather) or
+    CSV. Parquet and Arrow require pyarrow; if it is not installed the table is written as CSV next to the output file.
+    See scoresTable for the content of the table
+
+    :param path: Path to the collection (directory or tar archive)
+    :param out_path: Path to the output file
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type out_path: str
+    :type pathway_id: str
+    :type num_workers: int
+
+    :return: The path of the written file
+    :rtype: str
+    """
+    table = scoresTable(path, pathway_id, num_workers)
+    ext = os.path.splitext(out_path)[1]
+    if ext in ('.parquet', '.arrow', '.feather'):
+        try:
+            import pyarrow
+        except ImportError:
+            out_path = os.path.splitext(out_path)[0]+'.csv'
+            logger.warning('pyarrow is not installed, writing the table as CSV: '+str(out_path))
+            ext = '.csv'
+    if ext=='.parquet':
+        table.to_parquet(out_path, index=False)
+    elif ext in ('.arrow', '.feather'):
+        table.to_feather(out_path)
+    else:
+        table.to_csv(out_path, index=False)
+    return out_path
+
+
+##########################################################################
+############################## SELECT ####################################
+##########################################################################
+
+
+def readGroupScore(content, pathway_id='rp_pathway', score='global_score'):
+    """Return a BRSynth score of a group directly from the content of a SBML file
+
+    Only the element of the group is searched in the raw content, so that the SBML is neither validated nor
+    parsed into a libSBML document
+
+    :param content: The content of the SBML file
+    :param pathway_id: The id of the group (Default: rp_pathway)
+    :param score: The name of the BRSynth annotation (Default: global_score)
+
+    :type content: bytes
+    :type pathway_id: str
+    :type score: str
+
+    :return: The value of the score or None if the group or the score cannot be found
+    :rtype: float
+    """
+    group = re.search(rb'<(\w+:)?group\b[^>]*\bid="'+re.escape(pathway_id.encode('utf-8'))+rb'"[^>]*?(/?)>', content)
+    if not group or group.group(2):
+        return None
+    end = content.find(b'</'+(group.group(1) or b'')+b'group>', group.end())
+    value = re.search(rb'<(\w+:)?'+re.escape(score.encode('utf-8'))+rb'\b[^>]*\bvalue="([^"]*)"', content[group.end():end])
+    if not value:
+        return None
+    try:
+        return float(value.group(2))
+    except ValueError:
+        return None
+
+
+def _scanScore(args):
+    """Private worker function that returns the score of a pathway
+
+    :param args: Tuple of the name and content of the file, the pathway id and the name of the score
+
+    :type args: tuple
+
+    :return: Tuple of the name of the pathway and its score (None if it cannot be found)
+    :rtype: tuple
+    """
+    (name, content), pathway_id, score = args
+    return name, readGroupScore(content, pathway_id, score)
+
+
+def topPathways(path, k=100, pathway_id='rp_pathway', score='global_score', num_workers=None):
+    """Return the k pathways of a collection with the highest score
+
+    The score is read from the annotation of the group of each file without loading the models in libSBML
+    (see readGroupScore) in worker processes, and only the best k pathways are kept in memory. The pathways without a
+    finite score are skipped
+
+    :param path: Path to the collection (directory or tar archive)
+    :param k: The number of pathways to return (Default: 100)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param score: The name of the BRSynth annotation (Default: global_score)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type k: int
+    :type pathway_id: str
+    :type score: str
+    :type num_workers: int
+
+    :return: List of tuples of the name of the pathway and its score, by decreasing score
+    :rtype: list
+    """
+    if k<=0:
+        return []
+    heap = []
+    tasks = ((item, pathway_id, score) for item in iterCollection(path))
+    for name, value in boundedMap(_scanScore, tasks, num_workers):
+        if value is None or not math.isfinite(value):
+            logger.warning('Cannot find the '+str(score)+' of the pathway '+str(name))
+            continue
+        if len(heap)<k:
+            heapq.heappush(heap, (value, name))
+        elif (value, name)>heap[0]:
+            heapq.heapreplace(heap, (value, name))
+    return [(name, value) for value, name in sorted(heap, reverse=True)]
+
+
+##########################################################################
+############################## DEDUPLICATE ###############################
+##########################################################################
+
+
+def _fingerprintPathway(args):
+    """Private worker function that returns the fingerprint of a pathway
+
+    :param args: Tuple of the name and content of the file and the pathway id
+
+    :type args: tuple
+
+    :return: Tuple of the name of the pathway, its fingerprint and the error if the pathway cannot be read
+    :rtype: tuple
+    """
+    (name, content), pathway_id = args
+    try:
+        return name, readCollectionModel(name, content).pathwayFingerprint(pathway_id), None
+    except Exception as e:
+        return name, None, repr(e)
+
+
+def duplicatePathways(path, pathway_id='rp_pathway', num_workers=None):
+    """Group the identical pathways of a collection
+
+    The pathways are grouped by rpSBML.pathwayFingerprint, computed in worker processes in a single pass over the
+    collection. Pathways that cannot be read are not returned
+
+    :param path: Path to the collection (directory or tar archive)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type pathway_id: str
+    :type num_workers: int
+
+    :return: Dictionnary of the fingerprint and the sorted list of the names of the pathways
+    :rtype: dict
+    """
+    groups = {}
+    tasks = ((item, pathway_id) for item in iterCollection(path))
+    for name, fingerprint, error in boundedMap(_fingerprintPathway, tasks, num_workers):
+        if error:
+            logger.warning('Cannot fingerprint the pathway '+str(name)+': '+str(error))
+            continue
+        groups.setdefault(fingerprint, []).append(name)
+    return {fingerprint: sorted(names) for fingerprint, names in groups.items()}
+
+
+def uniquePathways(path, pathway_id='rp_pathway', num_workers=None):
+    """Return one pathway of each group of identical pathways of a collection
+
+    Use it to run the expensive steps (thermodynamics, FBA) once per unique pathway. See duplicatePathways
+
+    :param path: Path to the collection (directory or tar archive)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type pathway_id: str
+    :type num_workers: int
+
+    :return: Sorted list of the names of the first pathway (by name) of each group
+    :rtype: list
+    """
+    return sorted([names[0] for names in duplicatePathways(path, pathway_id, num_workers).values()])
+
+
+#bundles memory mapped by the worker processes, by path
+_bundles = {}
+
+
+def _genLPDelta(args):
+    """Private worker function that returns the delta of the linear program of a model relative to its chassis
+
+    The chassis bundle is memory mapped once per worker process
+
+    :param args: Tuple of the name and content of the file, the path of the chassis bundle and the objective id
+
+    :type args: tuple
+
+    :return: Tuple of the name of the model, the delta encoded as .npz and the error if the model cannot be read
+    :rtype: tuple
+    """
+    (name, content), bundle_path, objective_id = args
+    try:
+        if not bundle_path in _bundles:
+            _bundles[bundle_path] = rpFBA.readBundle(bundle_path)
+        delta = rpFBA.genDelta(_bundles[bundle_path], readCollectionModel(name, content).genLP(objective_id))
+        out_file = io.BytesIO()
+        rpFBA.writeDelta(delta, out_file)
+        return name, out_file.getvalue(), None
+    except Exception as e:
+        return name, None, repr(e)
+
+
+def writeLPDeltas(path, bundle_path, out_path, objective_id=None, num_workers=None):
+    """Write the linear programs of the models of a collection as deltas of the linear program of their chassis
+
+    The chassis is written once with rpFBA.writeBundle (from the genLP of the chassis model), and each merged model
+    of the collection is stored as the .npz file of its new columns, rows and bounds (see rpFBA.genDelta) named after
+    the model in the output directory. Use rpFBA.applyDelta to build the linear program of a model
+
+    :param path: Path to the collection (directory or tar archive)
+    :param bundle_path: Path to the bundle of the chassis
+    :param out_path: Path to the output directory
+    :param objective_id: The id of the objective (Default: None, the active objective of each model)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type path: str
+    :type bundle_path: str
+    :type out_path: str
+    :type objective_id: str
+    :type num_workers: int
+
+    :return: The number of deltas written
+    :rtype: int
+    """
+    os.makedirs(out_path, exist_ok=True)
+    count = 0
+    tasks = ((item, bundle_path, objective_id) for item in iterCollection(path))
+    for name, content, error in boundedMap(_genLPDelta, tasks, num_workers):
+        if error:
+            logger.warning('Cannot export the linear program of '+str(name)+': '+str(error))
+            continue
+        with open(os.path.join(out_path, name+'.npz'), 'wb') as out_file:
+            out_file.write(content)
+        count += 1
+    return count
+
+
+def fbaCollection(path, bundle_path, out_path=None, objective_id=None, pathway_id='rp_pathway', compress=False):
+    """Run the flux balance analysis of the models of a collection that are merged into the same chassis
+
+    The models are solved in sequence with a single rpFBA.rpBatchFBA solver of the chassis (warm started from the
+    previous solution if highspy is installed) while the files are read and written in background threads (see
+    processCollection), and the results are written as fba_ annotations (see rpSBML.fba)
+
+    :param path: Path to the collection (directory or tar archive)
+    :param bundle_path: Path to the bundle of the chassis (see rpFBA.writeBundle)
+    :param out_path: Path to the output directory (Default: None, the models are not written)
+    :param objective_id: The id of the objective (Default: None, the active objective of each model)
+    :param pathway_id: The pathway id of the heterologous pathway (Default: rp_pathway)
+    :param compress: Write gzip compressed files (.sbml.gz) (Default: False)
+
+    :type path: str
+    :type bundle_path: str
+    :type out_path: str
+    :type objective_id: str
+    :type pathway_id: str
+    :type compress: bool
+
+    :return: Tuple of the dictionnary of the name of the models and their objective value (nan if the model cannot be solved), and the statistics of the pipeline
+    :rtype: tuple
+    """
+    solver = rpFBA.rpBatchFBA(rpFBA.readBundle(bundle_path))
+    results, stats = processCollection(path,
+                                       lambda rpsbml: rpsbml.fba(objective_id, pathway_id, solver)['objective_value'],
+                                       out_path,
+                                       compress)
+    stats['simplex_iterations'] = solver.iterations
+    return results, stats
+
+
+##########################################################################
+############################## PIPELINE ##################################
+##########################################################################
+
+
+def _readerThread(path, in_queue, state):
+    """Private function of the thread that reads the files of a collection ahead of their processing
+
+    :param path: Path to the collection (directory or tar archive)
+    :param in_queue: The bounded queue of the (name, content) tuples, terminated by None
+    :param state: Dictionnary of the state of the pipeline, where the error of the thread is recorded
+
+    :type path: str
+    :type in_queue: queue.Queue
+    :type state: dict
+
+    :return: None
+    :rtype: None
+    """
+    try:
+        for item in iterCollection(path):
+            if state['stop']:
+                break
+            in_queue.put(item)
+    except Exception as e:
+        state['reader_error'] = e
+    finally:
+        in_queue.put(None)
+
+
+def _writerThread(out_queue, stats, lock):
+    """Private function of the threads that compress and write the SBML files
+
+    :param out_queue: The bounded queue of the (path, content, compress) tuples, terminated by None
+    :param stats: The statistics of the pipeline
+    :param lock: The lock of the statistics
+
+    :type out_queue: queue.Queue
+    :type stats: dict
+    :type lock: threading.Lock
+
+    :return: None
+    :rtype: None
+    """
+    while True:
+        item = out_queue.get()
+        if item is None:
+            break
+        out_path, content, compress = item
+        try:
+            if compress:
+                content = gzip.compress(content, compresslevel=6)
+            with open(out_path, 'wb') as out_file:
+                out_file.write(content)
+            with lock:
+                stats['written_bytes'] += len(content)
+        except Exception as e:
+            logger.error('Cannot write '+str(out_path)+': '+repr(e))
+            with lock:
+                stats['errors'] += 1
+
+
+def processCollection(path, func, out_path=None, compress=False, prefetch=16, max_pending_writes=16, num_writers=2):
+    """Apply a function to the models of a collection while reading and writing the files in background threads
+
+    A thread reads the files ahead of their processing and writer threads compress (gzip) and write the models that
+    have been processed, so that the main thread only parses and processes the models. The queues are bounded: the
+    reader waits when prefetch files are waiting to be processed and the main thread waits when max_pending_writes
+    models are waiting to be written. The function is called with the rpSBML object of each model; if it returns False
+    the model is not written, and if it does not change the model (see rpSBML.isDirty) the original file is written
+    without serialising the model again
+
+    :param path: Path to the collection (directory or tar archive)
+    :param func: Function that takes a rpSBML object
+    :param out_path: Path to the output directory (Default: None, the models are not written)
+    :param compress: Write gzip compressed files (.sbml.gz) (Default: False)
+    :param prefetch: The maximal number of files read ahead (Default: 16)
+    :param max_pending_writes: The maximal number of models waiting to be written (Default: 16)
+    :param num_writers: The number of writer threads (Default: 2)
+
+    :type path: str
+    :type func: function
+    :type out_path: str
+    :type compress: bool
+    :type prefetch: int
+    :type max_pending_writes: int
+    :type num_writers: int
+
+    :return: Tuple of the dictionnary of the name of the models and the return value of the function, and the statistics of the pipeline (files, read_bytes, written_bytes, errors, elapsed, files_per_s, read_mb_per_s, write_mb_per_s, read_wait_s, write_wait_s, mean_read_queue, mean_write_queue)
+    :rtype: tuple
+    """
+    if out_path and not os.path.isdir(out_path):
+        os.makedirs(out_path)
+    stats = {'files': 0, 'read_bytes': 0, 'written_bytes': 0, 'errors': 0, 'read_wait_s': 0.0, 'write_wait_s': 0.0}
+    lock = threading.Lock()
+    state = {'stop': False, 'reader_error': None}
+    in_queue = queue.Queue(maxsize=prefetch)
+    out_queue = queue.Queue(maxsize=max_pending_writes)
+    reader = threading.Thread(target=_readerThread, args=(path, in_queue, state), daemon=True)
+    writers = [threading.Thread(target=_writerThread, args=(out_queue, stats, lock), daemon=True) for i in range(num_writers)]
+    results = {}
+    read_queue_sizes = 0
+    read_samples = 0
+    write_queue_sizes = 0
+    write_samples = 0
+    start = time.time()
+    reader.start()
+    for writer in writers:
+        writer.start()
+    try:
+        while True:
+            read_queue_sizes += in_queue.qsize()
+            read_samples += 1
+            wait = time.time()
+            item = in_queue.get()
+            stats['read_wait_s'] += time.time()-wait
+            if item is None:
+                break
+            name, content = item
+            stats['files'] += 1
+            stats['read_bytes'] += len(content)
+            try:
+                rpsbml = readCollectionModel(name, content)
+                results[name] = func(rpsbml)
+            except Exception as e:
+                logger.warning('Cannot process the model '+str(name)+': '+repr(e))
+                with lock:
+                    stats['errors'] += 1
+                continue
+            if out_path and not results[name] is False:
+                file_name = os.path.join(out_path, str(name)+('.sbml.gz' if compress else '.sbml'))
+                write_queue_sizes += out_queue.qsize()
+                write_samples += 1
+                wait = time.time()
+                if rpsbml.isDirty():
+                    content = libsbml.writeSBMLToString(rpsbml.document).encode('utf-8')
+                out_queue.put((file_name, content, compress))
+                stats['write_wait_s'] += time.time()-wait
+    finally:
+        state['stop'] = True
+        #unblock the reader if the loop was interrupted
+        while reader.is_alive():
+            try:
+                in_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for writer in writers:
+            out_queue.put(None)
+        for writer in writers:
+            writer.join()
+    if state['reader_error']:
+        raise state['reader_error']
+    stats['elapsed'] = time.time()-start
+    stats['files_per_s'] = stats['files']/stats['elapsed'] if stats['elapsed'] else 0.0
+    stats['read_mb_per_s'] = stats['read_bytes']/1e6/stats['elapsed'] if stats['elapsed'] else 0.0
+    stats['write_mb_per_s'] = stats['written_bytes']/1e6/stats['elapsed'] if stats['elapsed'] else 0.0
+    stats['mean_read_queue'] = read_queue_sizes/max(read_samples, 1)
+    stats['mean_write_queue'] = write_queue_sizes/max(write_samples, 1)
+    logger.info('Processed '+str(stats['files'])+' files ('+str(round(stats['files_per_s'], 1))+' files/s, '+str(round(stats['read_mb_per_s'], 2))+' MB/s read, '+str(round(stats['write_mb_per_s'], 2))+' MB/s written)')
+    return results, stats
+
+
+##########################################################################
+############################## BUILD #####################################
+##########################################################################
+
+
+#species created by the worker processes, shared between the pathways they build (see rpSBML.createSpecies)
+_species_cache = {}
+
+
+def _delimiter(path):
+    """Private function that returns the delimiter of a table from its file extension
+
+    :param path: The path of the table
+
+    :type path: str
+
+    :return: Tab for .tsv and .txt files and comma otherwise
+    :rtype: str
+    """
+    return '\t' if path.endswith(('.tsv', '.txt')) else ','
+
+
+def readCompounds(path):
+    """Read the compounds table of the pathways
+
+    The table (comma separated, or tab separated for .tsv and .txt files, such as the compounds.txt of rp2paths) has
+    the id of the compounds (cid or id column) and optionally their name, smiles (or structure), inchi and inchikey.
+    The other columns are the MIRIAM cross references of the compounds (ex: mnx, chebi), separated by commas
+
+    :param path: The path of the compounds table
+
+    :type path: str
+
+    :raises FileNotFoundError: If the file cannot be found
+
+    :return: Dictionnary of the compound id and the dictionnary of its name, smiles, inchi, inchikey and chemXref
+    :rtype: dict
+    """
+    if not os.path.isfile(path):
+        logger.error('Invalid input file: '+str(path))
+        raise FileNotFoundError
+    compounds = {}
+    with open(path, newline='') as in_file:
+        for row in csv.DictReader(in_file, delimiter=_delimiter(path)):
+            cid = row.pop('cid', None) or row.pop('id', None)
+            if not cid:
+                continue
+            compound = {'name': row.pop('name', None) or None,
+                        'smiles': row.pop('smiles', None) or row.pop('structure', None) or None,
+                        'inchi': row.pop('inchi', None) or None,
+                        'inchikey': row.pop('inchikey', None) or None}
+            row.pop('structure', None)
+            compound['chemXref'] = {db: [i.strip() for i in value.split(',') if i.strip()] for db, value in row.items() if db and value}
+            compounds[cid] = compound
+    return compounds
+
+
+def _readSpecies(value):
+    """Private function that returns the species of a side of a step of the out_paths file of rp2paths
+
+    :param value: The side of the step (ex: 1.MNXM1:1.CMPD_0000000003)
+
+    :type value: str
+
+    :return: Dictionnary of the species and their stoichiometry
+    :rtype: dict
+    """
+    species = {}
+    for item in value.split(':'):
+        if item:
+            stoichiometry, cid = item.split('.', 1)
+            species[cid] = int(stoichiometry)
+    return species
+
+
+def readOutPaths(path):
+    """Iterate the pathways of the out_paths file of rp2paths
+
+    The rows of the file are read one pathway at a time. The steps are numbered in the order of the file, the
+    first step being the one that produces the target
+
+    :param path: The path of the out_paths file
+
+    :type path: str
+
+    :raises FileNotFoundError: If the file cannot be found
+
+    :return: Generator of the tuples of the path id and the list of its steps (dictionnaries of the rule ids, left, right, step, path_id, transformation_id and ec)
+    :rtype: generator
+    """
+    if not os.path.isfile(path):
+        logger.error('Invalid input file: '+str(path))
+        raise FileNotFoundError
+    with open(path, newline='') as in_file:
+        steps = []
+        for row in csv.DictReader(in_file, delimiter=_delimiter(path)):
+            path_id = int(row['Path ID'])
+            if steps and steps[0]['path_id']!=path_id:
+                yield steps[0]['path_id'], steps
+                steps = []
+            steps.append({'rule_ids': [i.strip() for i in row['Rule ID'].split(',') if i.strip()] or [None],
+                          'left': _readSpecies(row['Left']),
+                          'right': _readSpecies(row['Right']),
+                          'step': len(steps)+1,
+                          'path_id': path_id,
+                          'transformation_id': row.get('Unique ID') or None,
+                          'ec': [i.strip() for i in (row.get('EC number') or '').split(',') if i.strip() and i.strip()!='NOEC']})
+        if steps:
+            yield steps[0]['path_id'], steps
+
+
+def _buildPathways(args):
+    """Private worker function that builds the models of the sub-pathways of a pathway of rp2paths
+
+    :param args: Tuple of the path id, the steps, the compounds of the steps and the parameters of buildCollection
+
+    :type args: tuple
+
+    :return: Tuple of the path id, the list of the names and SBML contents of the models, and the error if the pathway cannot be built
+    :rtype: tuple
+    """
+    path_id, steps, compounds, compartment_id, upper_flux_bound, lower_flux_bound, max_subpaths = args
+    try:
+        models = []
+        #as in the models of rpReader, all the species of the steps of rp2paths are central species
+        species_ids = []
+        for step in steps:
+            for cid in list(step['left'])+list(step['right']):
+                if not cid in species_ids:
+                    species_ids.append(cid)
+        rule_ids = itertools.islice(itertools.product(*[step['rule_ids'] for step in steps]), max_subpaths)
+        for sub_step, rules in enumerate(rule_ids, 1):
+            name = 'rp_'+str(path_id)+'_'+str(sub_step)
+            rpsbml = rpSBML.rpSBML(name)
+            rpsbml.genericModel(name, name, {'mnx': [compartment_id]}, compartment_id, upper_flux_bound, lower_flux_bound)
+            rpsbml.createPathway('rp_pathway')
+            rpsbml.createPathway('central_species')
+            for cid in species_ids:
+                compound = compounds.get(cid, {})
+                rpsbml.createSpecies(cid,
+                                     compartment_id,
+                                     compound.get('name'),
+                                     compound.get('chemXref', {}),
+                                     compound.get('inchi'),
+                                     compound.get('inchikey'),
+                                     compound.get('smiles'),
+                                     'central_species',
+                                     species_cache=_species_cache)
+            for step, rule_id in zip(steps, rules):
+                rpsbml.createReaction('RP'+str(step['step']),
+                                      upper_flux_bound,
+                                      lower_flux_bound,
+                                      {'rule_id': rule_id,
+                                       'left': step['left'],
+                                       'right': step['right'],
+                                       'step': step['step'],
+                                       'sub_step': sub_step,
+                                       'path_id': path_id,
+                                       'transformation_id': step['transformation_id'],
+                                       'rule_score': None,
+                                       'rule_ori_reac': None},
+                                      compartment_id,
+                                      None,
+                                      {'ec': step['ec']} if step['ec'] else {},
+                                      'rp_pathway')
+            models.append((name, libsbml.writeSBMLToString(rpsbml.document).encode('utf-8')))
+        return path_id, models, None
+    except Exception as e:
+        return path_id, [], repr(e)
+
+
+def buildCollection(out_paths, compounds, out_path, compartment_id='MNXC3', upper_flux_bound=999999, lower_flux_bound=0, max_subpaths=10, num_workers=None):
+    """Build the models of the pathways of rp2paths and write them as a collection
+
+    The out_paths file is streamed one pathway at a time to worker processes, with only the compounds of its steps.
+    Each combination of the rule ids of the steps is a sub-pathway, written as the model rp_[path id]_[sub-pathway].
+    The models are created from the cached genericModel and each worker process keeps the species it has created
+    (with their annotation) to copy them into the next pathways that contain them (see rpSBML.createSpecies)
+
+    :param out_paths: The path of the out_paths file of rp2paths
+    :param compounds: The path of the compounds table (see readCompounds) or its dictionnary
+    :param out_path: The path of the output directory, or of a tar archive (.tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz)
+    :param compartment_id: The id of the compartment of the models (Default: MNXC3)
+    :param upper_flux_bound: The upper flux bound of the reactions (Default: 999999)
+    :param lower_flux_bound: The lower flux bound of the reactions (Default: 0)
+    :param max_subpaths: The maximal number of sub-pathways of each pathway (Default: 10)
+    :param num_workers: The number of worker processes (Default: None, the number of CPUs)
+
+    :type out_paths: str
+    :type compounds: Union[str, dict]
+    :type out_path: str
+    :type compartment_id: str
+    :type upper_flux_bound: float
+    :type lower_flux_bound: float
+    :type max_subpaths: int
+    :type num_workers: int
+
+    :return: The number of models written
+    :rtype: int
+    """
+    if isinstance(compounds, str):
+        compounds = readCompounds(compounds)
+    tasks = ((path_id,
+              steps,
+              {cid: compounds[cid] for step in steps for cid in list(step['left'])+list(step['right']) if cid in compounds},
+              compartment_id,
+              upper_flux_bound,
+              lower_flux_bound,
+              max_subpaths) for path_id, steps in readOutPaths(out_paths))
+    tar = None
+    if out_path.endswith(('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tar.xz')):
+        mode = {'gz': 'w:gz', 'tgz': 'w:gz', 'bz2': 'w:bz2', 'xz': 'w:xz'}.get(out_path.split('.')[-1], 'w')
+        tar = tarfile.open(out_path, mode)
+    elif not os.path.isdir(out_path):
+        os.makedirs(out_path)
+    count = 0
+    try:
+        for path_id, models, error in boundedMap(_buildPathways, tasks, num_workers):
+            if error:
+                logger.warning('Cannot build the pathway '+str(path_id)+': '+str(error))
+                continue
+            for name, content in models:
+                if tar:
+                    info = tarfile.TarInfo(name+'.sbml')
+                    info.size = len(content)
+                    info.mtime = time.time()
+                    tar.addfile(info, io.BytesIO(content))
+                else:
+                    with open(os.path.join(out_path, name+'.sbml'), 'wb') as out_file:
+                        out_file.write(content)
+                count += 1
+    finally:
+        if tar:
+            tar.close()
+    return count
@@ -0,0 +1,381 @@
+"""rpFBA
+.. moduleauthor:: Melchior du Lac
+"""
+
+
+import os
+import json
+import logging
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+
+## @package rpFBA
+# Linear programs of the flux balance analysis of rpSBML models
+#
+# rpSBML.genLP returns the linear program of a model as a dictionnary of the ids of the reactions (columns) and
+# species (rows), the sparse stoichiometry matrix (S), the flux bounds (lb, ub) and the coefficients of the objective
+# (c). When screening many pathways merged into the same chassis, the linear program of the chassis is written once
+# as a bundle (a directory of raw .npy arrays) that is memory mapped by readBundle, so that the worker processes share
+# the pages of the chassis instead of copying them, and each merged pathway is stored as a delta (the new columns,
+# rows and bounds in a small .npz file) that is appended to the chassis with applyDelta. The linear programs are solved
+# with HiGHS, through scipy.optimize.linprog (solve) or, for batches of deltas of the same chassis, through highspy (if
+# it is installed) so that each solve starts from the basis of the previous one (rpBatchFBA). This module does not
+# depend on libSBML.
+
+
+logger = logging.getLogger(__name__)
+
+
+BUNDLE_ARRAYS = ('S_data', 'S_indices', 'S_indptr', 'lb', 'ub', 'c')
+
+
+def writeBundle(lp, path):
+    """Write the linear program of a chassis as a memory mappable bundle
+
+    The bundle is a directory with the arrays of the CSC stoichiometry matrix, the bounds and the objective
+    coefficients as uncompressed .npy files and the ids of the species, reactions and objective in meta.json
+
+    :param lp: The linear program (as returned by rpSBML.genLP)
+    :param path: The path of the output directory
+
+    :type lp: dict
+    :type path: str
+
+    :return: None
+    :rtype: None
+    """
+    os.makedirs(path, exist_ok=True)
+    S = sparse.csc_matrix(lp['S'])
+    S.sort_indices()
+    arrays = {'S_data': S.data.astype(np.float64),
+              'S_indices': S.indices.astype(np.int32),
+              'S_indptr': S.indptr.astype(np.int64),
+              'lb': np.asarray(lp['lb'], dtype=np.float64),
+              'ub': np.asarray(lp['ub'], dtype=np.float64),
+              'c': np.asarray(lp['c'], dtype=np.float64)}
+    for name in BUNDLE_ARRAYS:
+        np.save(os.path.join(path, name+'.npy'), arrays[name])
+    with open(os.path.join(path, 'meta.json'), 'w') as out_file:
+        json.dump({'species': list(lp['species']),
+                   'reactions': list(lp['reactions']),
+                   'objective_id': lp.get('objective_id'),
+                   'sense': lp.get('sense', 'maximize')}, out_file)
+
+
+def readBundle(path, mmap_mode='r'):
+    """Read the linear program of a chassis from a bundle
+
+    The arrays are memory mapped (read only by default), so that the processes reading the same bundle share its
+    pages through the page cache
+
+    :param path: The path of the bundle directory
+    :param mmap_mode: The memory mapping mode of numpy.load (Default: r)
+
+    :type path: str
+    :type mmap_mode: str
+
+    :raises FileNotFoundError: If the bundle cannot be found
+
+    :return: The linear program
+    :rtype: dict
+    """
+    if not os.path.isfile(os.path.join(path, 'meta.json')):
+        logger.error('Invalid bundle: '+str(path))
+        raise FileNotFoundError
+    with open(os.path.join(path, 'meta.json')) as in_file:
+        lp = json.load(in_file)
+    arrays = {name: np.load(os.path.join(path, name+'.npy'), mmap_mode=mmap_mode) for name in BUNDLE_ARRAYS}
+    lp['S'] = sparse.csc_matrix((arrays['S_data'], arrays['S_indices'], arrays['S_indptr']),
+                                shape=(len(lp['species']), len(lp['reactions'])),
+                                copy=False)
+    lp['lb'] = arrays['lb']
+    lp['ub'] = arrays['ub']
+    lp['c'] = arrays['c']
+    return lp
+
+
+def genDelta(chassis, lp):
+    """Return the difference between the linear program of a model and the one of its chassis
+
+    The delta contains the species and reactions of the model that are not in the chassis (new rows and columns),
+    the stoichiometry of the new reactions over the rows of the chassis followed by the new rows, the chassis
+    reactions whose bounds are different and the objective of the model. The stoichiometry of the reactions of the
+    chassis is assumed not to change, and the species and reactions of the chassis that are not in the model are kept
+
+    :param chassis: The linear program of the chassis (ex: from readBundle)
+    :param lp: The linear program of the model (as returned by rpSBML.genLP)
+
+    :type chassis: dict
+    :type lp: dict
+
+    :return: The delta
+    :rtype: dict
+    """
+    rows = {i: y for y, i in enumerate(chassis['species'])}
+    cols = {i: y for y, i in enumerate(chassis['reactions'])}
+    new_species = [i for i in lp['species'] if not i in rows]
+    for spe_id in new_species:
+        rows[spe_id] = len(rows)
+    new_cols = [y for y, i in enumerate(lp['reactions']) if not i in cols]
+    ########## new columns ##############
+    S = sparse.csc_matrix(lp['S'])[:, new_cols].tocoo()
+    row_map = np.array([rows[i] for i in lp['species']], dtype=np.int32)
+    S_new = sparse.csc_matrix((S.data, (row_map[S.row], S.col)), shape=(len(rows), len(new_cols)))
+    ########## changed bounds ###########
+    old_cols = np.array([y for y, i in enumerate(lp['reactions']) if i in cols], dtype=np.int64)
+    chassis_cols = np.array([cols[lp['reactions'][i]] for i in old_cols], dtype=np.int64)
+    lb = np.asarray(lp['lb'])
+    ub = np.asarray(lp['ub'])
+    changed = (np.asarray(chassis['lb'])[chassis_cols]!=lb[old_cols])|(np.asarray(chassis['ub'])[chassis_cols]!=ub[old_cols])
+    ########## objective ################
+    c = np.asarray(lp['c'])
+    col_map = np.empty(len(lp['reactions']), dtype=np.int64)
+    col_map[old_cols] = chassis_cols
+    col_map[new_cols] = len(cols)+np.arange(len(new_cols))
+    obj_index = np.flatnonzero(c)
+    return {'species': new_species,
+            'reactions': [lp['reactions'][i] for i in new_cols],
+            'S': S_new,
+            'lb': lb[new_cols],
+            'ub': ub[new_cols],
+            'bound_index': chassis_cols[changed],
+            'bound_lb': lb[old_cols][changed],
+            'bound_ub': ub[old_cols][changed],
+            'objective_index': col_map[obj_index],
+            'objective_coefficients': c[obj_index],
+            'objective_id': lp.get('objective_id'),
+            'sense': lp.get('sense', 'maximize')}
+
+
+def writeDelta(delta, path):
+    """Write the delta of a model to a .npz file
+
+    :param delta: The delta (as returned by genDelta)
+    :param path: The path of the output file
+
+    :type delta: dict
+    :type path: str
+
+    :return: None
+    :rtype: None
+    """
+    S = delta['S'].tocoo()
+    np.savez(path,
+             species=np.array(delta['species'], dtype=str),
+             reactions=np.array(delta['reactions'], dtype=str),
+             S_shape=np.array(S.shape, dtype=np.int64),
+             S_row=S.row.astype(np.int32),
+             S_col=S.col.astype(np.int32),
+             S_data=S.data,
+             lb=delta['lb'],
+             ub=delta['ub'],
+             bound_index=delta['bound_index'],
+             bound_lb=delta['bound_lb'],
+             bound_ub=delta['bound_ub'],
+             objective_index=delta['objective_index'],
+             objective_coefficients=delta['objective_coefficients'],
+             objective=np.array([delta['objective_id'] or '', delta['sense']], dtype=str))
+
+
+def readDelta(path):
+    """Read the delta of a model from a .npz file
+
+    :param path: The path of the file
+
+    :type path: str
+
+    :raises FileNotFoundError: If the file cannot be found
+
+    :return: The delta
+    :rtype: dict
+    """
+    if not os.path.isfile(path):
+        logger.error('Invalid input file: '+str(path))
+        raise FileNotFoundError
+    with np.load(path) as arrays:
+        delta = {i: arrays[i] for i in arrays.files}
+    delta['S'] = sparse.csc_matrix((delta.pop('S_data'), (delta.pop('S_row'), delta.pop('S_col'))),
+                                   shape=tuple(delta.pop('S_shape')))
+    delta['species'] = delta['species'].tolist()
+    delta['reactions'] = delta['reactions'].tolist()
+    objective = delta.pop('objective').tolist()
+    delta['objective_id'] = objective[0] or None
+    delta['sense'] = objective[1]
+    return delta
+
+
+def applyDelta(chassis, delta):
+    """Return the linear program of a model from the one of its chassis and its delta
+
+    The arrays of the chassis are not modified
+
+    :param chassis: The linear program of the chassis (ex: from readBundle)
+    :param delta: The delta of the model (as returned by genDelta or readDelta)
+
+    :type chassis: dict
+    :type delta: dict
+
+    :return: The linear program of the model
+    :rtype: dict
+    """
+    S = chassis['S']
+    if len(delta['species']):
+        S = sparse.vstack([S, sparse.csc_matrix((len(delta['species']), S.shape[1]))], format='csc')
+    S = sparse.hstack([S, delta['S']], format='csc')
+    lb = np.concatenate([chassis['lb'], delta['lb']])
+    ub = np.concatenate([chassis['ub'], delta['ub']])
+    lb[delta['bound_index']] = delta['bound_lb']
+    ub[delta['bound_index']] = delta['bound_ub']
+    c = np.zeros(S.shape[1])
+    c[delta['objective_index']] = delta['objective_coefficients']
+    return {'species': list(chassis['species'])+list(delta['species']),
+            'reactions': list(chassis['reactions'])+list(delta['reactions']),
+            'S': S,
+            'lb': lb,
+            'ub': ub,
+            'c': c,
+            'objective_id': delta['objective_id'],
+            'sense': delta['sense']}
+
+
+def _result(status, objective_value=np.nan, fluxes=None):
+    """Private function that returns the result of a solve
+
+    :param status: The status of the solver (optimal if the solution is optimal)
+    :param objective_value: The value of the objective (Default: nan)
+    :param fluxes: The fluxes of the reactions (Default: None)
+
+    :type status: str
+    :type objective_value: float
+    :type fluxes: numpy.ndarray
+
+    :return: Dictionnary of the status, objective value and fluxes
+    :rtype: dict
+    """
+    return {'status': status, 'objective_value': objective_value, 'fluxes': fluxes}
+
+
+def solve(lp):
+    """Solve the linear program of a model with the HiGHS solver of scipy.optimize.linprog
+
+    :param lp: The linear program (as returned by rpSBML.genLP or applyDelta)
+
+    :type lp: dict
+
+    :return: Dictionnary of the status (optimal if the solution is optimal, the message of the solver otherwise), the objective value and the array of the fluxes of the reactions (None if not optimal)
+    :rtype: dict
+    """
+    sign = -1.0 if lp['sense']=='maximize' else 1.0
+    res = linprog(sign*np.asarray(lp['c']),
+                  A_eq=lp['S'],
+                  b_eq=np.zeros(lp['S'].shape[0]),
+                  bounds=np.column_stack([lp['lb'], lp['ub']]),
+                  method='highs')
+    if res.status!=0:
+        logger.warning('Cannot solve the objective '+str(lp['objective_id'])+': '+str(res.message))
+        return _result(str(res.message))
+    return _result('optimal', sign*res.fun, res.x)
+
+
+class rpBatchFBA:
+    """Solver of the linear programs of many models that share the same chassis
+
+    The chassis is passed to the solver once. For each delta, the new rows and columns are added, the bounds and
+    objective are changed, the model is solved and the changes are reverted, so that the matrix of the chassis is never
+    copied or rebuilt. With highspy, the solver keeps the basis of the previous solve as the starting point of the next
+    one; without it, each model is built with applyDelta and solved with solve
+    """
+    def __init__(self, chassis):
+        """Constructor of the class
+
+        :param chassis: The linear program of the chassis (ex: from readBundle)
+
+        :type chassis: dict
+        """
+        self.logger = logging.getLogger(__name__)
+        self.chassis = chassis
+        self.highs = None
+        self.iterations = 0
+        if highspy:
+            self._passChassis()
+        else:
+            self.logger.debug('highspy is not installed, the deltas are solved without warm start')
+
+
+    def _passChassis(self):
+        """Pass the linear program of the chassis to highspy
+
+        :return: None
+        :rtype: None
+        """
+        S = sparse.csc_matrix(self.chassis['S'])
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        num_rows, num_cols = S.shape
+        self.highs.addRows(num_rows, np.zeros(num_rows), np.zeros(num_rows), 0, np.zeros(num_rows, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0))
+        self.highs.addCols(num_cols,
+                           np.zeros(num_cols),
+                           np.asarray(self.chassis['lb'], dtype=np.float64),
+                           np.asarray(self.chassis['ub'], dtype=np.float64),
+                           S.nnz,
+                           S.indptr[:-1].astype(np.int32),
+                           S.indices.astype(np.int32),
+                           S.data.astype(np.float64))
+
+
+    def solveDelta(self, delta):
+        """Solve the linear program of a model from its delta to the chassis
+
+        :param delta: The delta of the model (as returned by genDelta or readDelta)
+
+        :type delta: dict
+
+        :return: Same as solve, the fluxes are in the order of the reactions of the chassis followed by the reactions of the delta
+        :rtype: dict
+        """
+        if not self.highs:
+            return solve(applyDelta(self.chassis, delta))
+        num_rows, num_cols = self.chassis['S'].shape
+        num_new_rows = len(delta['species'])
+        num_new_cols = len(delta['reactions'])
+        S = sparse.csc_matrix(delta['S'])
+        objective_index = np.asarray(delta['objective_index'], dtype=np.int32)
+        bound_index = np.asarray(delta['bound_index'], dtype=np.int32)
+        self.highs.addRows(num_new_rows, np.zeros(num_new_rows), np.zeros(num_new_rows), 0, np.zeros(num_new_rows, dtype=np.int32), np.zeros(0, dtype=np.int32), np.zeros(0))
+        self.highs.addCols(num_new_cols,
+                           np.zeros(num_new_cols),
+                           np.asarray(delta['lb'], dtype=np.float64),
+                           np.asarray(delta['ub'], dtype=np.float64),
+                           S.nnz,
+                           S.indptr[:-1].astype(np.int32),
+                           S.indices.astype(np.int32),
+                           S.data.astype(np.float64))
+        self.highs.changeColsBounds(len(bound_index), bound_index, np.asarray(delta['bound_lb'], dtype=np.float64), np.asarray(delta['bound_ub'], dtype=np.float64))
+        self.highs.changeColsCost(len(objective_index), objective_index, np.asarray(delta['objective_coefficients'], dtype=np.float64))
+        self.highs.changeObjectiveSense(highspy.ObjSense.kMaximize if delta['sense']=='maximize' else highspy.ObjSense.kMinimize)
+        try:
+            self.highs.run()
+            self.iterations += self.highs.getInfo().simplex_iteration_count
+            status = self.highs.getModelStatus()
+            if status==highspy.HighsModelStatus.kOptimal:
+                result = _result('optimal',
+                                 self.highs.getInfo().objective_function_value,
+                                 np.array(self.highs.getSolution().col_value))
+            else:
+                self.logger.warning('Cannot solve the objective '+str(delta['objective_id'])+': '+str(self.highs.modelStatusToString(status)))
+                result = _result(self.highs.modelStatusToString(status))
+        finally:
+            ########## revert the delta #########
+            chassis_index = objective_index[objective_index<num_cols]
+            self.highs.changeColsCost(len(chassis_index), chassis_index, np.zeros(len(chassis_index)))
+            self.highs.changeColsBounds(len(bound_index), bound_index, np.asarray(self.chassis['lb'], dtype=np.float64)[bound_index], np.asarray(self.chassis['ub'], dtype=np.float64)[bound_index])
+            self.highs.deleteCols(num_new_cols, np.arange(num_cols, num_cols+num_new_cols, dtype=np.int32))
+            self.highs.deleteRows(num_new_rows, np.arange(num_rows, num_rows+num_new_rows, dtype=np.int32))
+        return result
@@ -1,22 +1,165 @@
 import networkx as nx
+import numpy as np
 import logging
 
 
+#MetaNetX ids of the cofactors and currency metabolites that connect most of the reactions of a model
+CURRENCY_SPECIES = ['MNXM1', 'MNXM2', 'MNXM3', 'MNXM4', 'MNXM5', 'MNXM6', 'MNXM7', 'MNXM8', 'MNXM9', 'MNXM10',
+                    'MNXM11', 'MNXM12', 'MNXM13', 'MNXM14', 'MNXM15', 'MNXM17', 'MNXM26', 'MNXM40', 'MNXM43', 'MNXM51',
+                    'MNXM63', 'MNXM121', 'MNXM128', 'MNXM147']
+
+
+class _LazyAnnotationDict(dict):
+    """Node attribute dictionary that reads the MIRIAM and BRSynth annotations of its libSBML object on first access
+
+    The annotations are parsed only when the 'miriam' or 'brsynth' keys are accessed and the result is memoized
+    """
+    lazy_keys = ('miriam', 'brsynth')
+
+
+    def setAnnotationSource(self, rpsbml, sbase):
+        """Set the object from which the annotations are read
+
+        :param rpsbml: The rpSBML object used to parse the annotations
+        :param sbase: The libSBML object holding the annotation
+
+        :type rpsbml: rpSBML
+        :type sbase: libsbml.SBase
+
+        :return: None
+        :rtype: None
+        """
+        self._rpsbml = rpsbml
+        self._sbase = sbase
+
+
+    def resetAnnotation(self):
+        """Forget the parsed annotations so that they are read again on the next access
+
+        :return: None
+        :rtype: None
+        """
+        for key in self.lazy_keys:
+            self.pop(key, None)
+
+
+    def _hasSource(self):
+        return getattr(self, '_sbase', None) is not None
+
+
+    def __missing__(self, key):
+        if key in self.lazy_keys and self._hasSource():
+            if key=='miriam':
+                value = self._rpsbml.readMIRIAMAnnotation(self._sbase.getAnnotation())
+            else:
+                value = self._rpsbml.readBRSYNTHAnnotation(self._sbase.getAnnotation())
+            self[key] = value
+            return value
+        raise KeyError(key)
+
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or (key in self.lazy_keys and self._hasSource())
+
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+
+    def copy(self):
+        new_dict = _LazyAnnotationDict(self)
+        if self._hasSource():
+            new_dict.setAnnotationSource(self._rpsbml, self._sbase)
+        return new_dict
+
+
+class _AnnotatedDiGraph(nx.DiGraph):
+    """networkx DiGraph whose node attributes are lazily annotated
+
+    The version attribute is incremented every time nodes or edges are added or removed, so that the results
+    computed on the graph can be invalidated
+    """
+    node_attr_dict_factory = _LazyAnnotationDict
+    version = 0
+
+
+    def _changed(self):
+        self.version += 1
+
+
+    def add_node(self, node_for_adding, **attr):
+        self._changed()
+        super().add_node(node_for_adding, **attr)
+
+
+    def add_nodes_from(self, nodes_for_adding, **attr):
+        self._changed()
+        super().add_nodes_from(nodes_for_adding, **attr)
+
+
+    def remove_node(self, n):
+        self._changed()
+        super().remove_node(n)
+
+
+    def remove_nodes_from(self, nodes):
+        self._changed()
+        super().remove_nodes_from(nodes)
+
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        self._changed()
+        super().add_edge(u_of_edge, v_of_edge, **attr)
+
+
+    def add_edges_from(self, ebunch_to_add, **attr):
+        self._changed()
+        super().add_edges_from(ebunch_to_add, **attr)
+
+
+    def remove_edge(self, u, v):
+        self._changed()
+        super().remove_edge(u, v)
+
+
+    def remove_edges_from(self, ebunch):
+        self._changed()
+        super().remove_edges_from(ebunch)
+
+
+    def clear(self):
+        self._changed()
+        super().clear()
+
+
+    def clear_edges(self):
+        self._changed()
+        super().clear_edges()
+
+
 class rpGraph:
     """The class that hosts the networkx related functions
     """
-    def __init__(self, rpsbml, pathway_id='rp_pathway', species_group_id='central_species'):
+    def __init__(self, rpsbml, pathway_id='rp_pathway', species_group_id='central_species', live=False):
         """Constructor of the class
 
-        Automatically constructs the network when calling the construtor
+        Automatically constructs the network when calling the construtor. If live is True, the graph listens to the
+        changes made to the model through rpSBML (see rpSBML.addListener()) and is updated incrementally.
+        If a list of pathway ids is passed, the graph is built over the union of the pathways and each pathway can be
+        queried through pathwayView()
 
         :param rpsbml: The rpSBML object
-        :param pathway_id: The pathway id of the heterologous pathway
+        :param pathway_id: The pathway id, or list of pathway ids, of the heterologous pathway
         :param species_group_id: The id of the central species
+        :param live: Keep the graph in sync with the changes of the model (Default: False)
 
         :type rpsbml: rpSBML
-        :type pathway_id: str
+        :type pathway_id: Union[str, list]
         :type species_group_id: str
+        :type live: bool
         """
         self.rpsbml = rpsbml
         self.logger = logging.getLogger(__name__)
@@ -30,7 +173,37 @@ class rpGraph:
         self.pathway_id = pathway_id
         self.num_reactions = 0
         self.num_species = 0
+        self._reaction_graph = None
+        self._ordered_reactions = None
+        self._num_orders = None
+        self._species_classes = None
+        self._cache_version = None
+        self._central_ids = set()
+        self.pathway_members = {}
+        self.pathway_brsynth = {}
+        self._views = {}
         self._makeGraph(pathway_id, species_group_id)
+        if live:
+            self.rpsbml.addListener(self._onModelChange)
+
+
+    def _checkCache(self):
+        """Private function that resets the cached results if the graph has changed since they were computed
+
+        :return: None
+        :rtype: None
+        """
+        if self.G is None:
+            return
+        if not self._cache_version==self.G.version:
+            node_types = [node['type'] for node_name, node in self.G.nodes(data=True)]
+            self.num_species = node_types.count('species')
+            self.num_reactions = node_types.count('reaction')
+            self._reaction_graph = None
+            self._ordered_reactions = None
+            self._num_orders = None
+            self._species_classes = None
+            self._cache_version = self.G.version
 
 
     def _makeGraph(self, pathway_id='rp_pathway', species_group_id='central_species'):
@@ -45,41 +218,252 @@ class rpGraph:
         :return: None
         :rtype: None
         """
-        self.species = [self.rpsbml.model.getSpecies(i) for i in self.rpsbml.readUniqueRPspecies(pathway_id)]
+        if isinstance(pathway_id, str):
+            pathway_ids = [pathway_id]
+        else:
+            pathway_ids = list(pathway_id)
         groups = self.rpsbml.model.getPlugin('groups')
         central_species = groups.getGroup(species_group_id)
-        central_species = [i.getIdRef() for i in central_species.getListOfMembers()]
-        rp_pathway = groups.getGroup(pathway_id)
-        self.reactions = [self.rpsbml.model.getReaction(i.getIdRef()) for i in rp_pathway.getListOfMembers()]
-        self.G = nx.DiGraph(brsynth=self.rpsbml.readBRSYNTHAnnotation(rp_pathway.getAnnotation()))
+        self._central_ids = set([i.getIdRef() for i in central_species.getListOfMembers()])
+        #union of the species and reactions of all the pathways
+        species_ids = {}
+        reaction_ids = {}
+        for path_id in pathway_ids:
+            rp_pathway = groups.getGroup(path_id)
+            self.pathway_members[path_id] = set([i.getIdRef() for i in rp_pathway.getListOfMembers()])
+            self.pathway_brsynth[path_id] = self.rpsbml.readBRSYNTHAnnotation(rp_pathway.getAnnotation())
+            for member in rp_pathway.getListOfMembers():
+                reaction_ids[member.getIdRef()] = None
+            for spe_id in self.rpsbml.readUniqueRPspecies(path_id):
+                species_ids[spe_id] = None
+        self.species = [self.rpsbml.model.getSpecies(i) for i in species_ids]
+        self.reactions = [self.rpsbml.model.getReaction(i) for i in reaction_ids]
+        self.G = _AnnotatedDiGraph(brsynth=self.pathway_brsynth[pathway_ids[0]])
         #nodes
+        #NOTE: the miriam and brsynth attributes of the nodes are only parsed when accessed
         for spe in self.species:
             self.num_species += 1
-            is_central = False
-            if spe.getId() in central_species:
-                is_central = True
-            self.G.add_node(spe.getId(), 
-                            type='species',
-                            name=spe.getName(),
-                            miriam=self.rpsbml.readMIRIAMAnnotation(spe.getAnnotation()),
-                            brsynth=self.rpsbml.readBRSYNTHAnnotation(spe.getAnnotation()),
-                            central_species=is_central)
+            self._addSpeciesNode(spe)
         for reac in self.reactions:
             self.num_reactions += 1
             self.G.add_node(reac.getId(),
-                            type='reaction',
-                            miriam=self.rpsbml.readMIRIAMAnnotation(reac.getAnnotation()),
-                            brsynth=self.rpsbml.readBRSYNTHAnnotation(reac.getAnnotation()))
+                            type='reaction')
+            self.G.nodes[reac.getId()].setAnnotationSource(self.rpsbml, reac)
         #edges
         for reaction in self.reactions:
-            for reac in reaction.getListOfReactants():
+            self._addReactionEdges(reaction)
+
+
+    def _addSpeciesNode(self, spe):
+        """Private function that adds a species node to the graph
+
+        :param spe: The libSBML species
+
+        :type spe: libsbml.Species
+
+        :return: None
+        :rtype: None
+        """
+        self.G.add_node(spe.getId(),
+                        type='species',
+                        name=spe.getName(),
+                        central_species=spe.getId() in self._central_ids)
+        self.G.nodes[spe.getId()].setAnnotationSource(self.rpsbml, spe)
+
+
+    def _addReactionEdges(self, reaction, species_id=None):
+        """Private function that adds the edges between a reaction and its reactants and products
+
+        The edges to the species that are not nodes of the graph (not yet created in the model) are skipped; they are
+        added when the species is created
+
+        :param reaction: The libSBML reaction
+        :param species_id: Only add the edges of this species (Default: None, all the species)
+
+        :type reaction: libsbml.Reaction
+        :type species_id: str
+
+        :return: None
+        :rtype: None
+        """
+        for reac in reaction.getListOfReactants():
+            if reac.species in self.G and (species_id==None or reac.species==species_id):
                 self.G.add_edge(reac.species,
                                 reaction.getId(),
                                 stoichio=reac.stoichiometry)
-            for prod in reaction.getListOfProducts():
+        for prod in reaction.getListOfProducts():
+            if prod.species in self.G and (species_id==None or prod.species==species_id):
                 self.G.add_edge(reaction.getId(),
                                 prod.species,
-                                stoichio=reac.stoichiometry)
+                                stoichio=prod.stoichiometry)
+
+
+    ######################## Live update ##########################
+
+
+    def _addReaction(self, reaction_id):
+        """Private function that adds a reaction of the model, and its missing species, to the graph
+
+        :param reaction_id: The id of the reaction
+
+        :type reaction_id: str
+
+        :return: None
+        :rtype: None
+        """
+        reaction = self.rpsbml.model.getReaction(reaction_id)
+        if not reaction or reaction_id in self.G:
+            return
+        self.logger.debug('Adding reaction '+str(reaction_id)+' to the graph')
+        for spe_ref in list(reaction.getListOfReactants())+list(reaction.getListOfProducts()):
+            if not spe_ref.species in self.G:
+                spe = self.rpsbml.model.getSpecies(spe_ref.species)
+                if spe:
+                    self.species.append(spe)
+                    self._addSpeciesNode(spe)
+        self.reactions.append(reaction)
+        self.G.add_node(reaction_id,
+                        type='reaction')
+        self.G.nodes[reaction_id].setAnnotationSource(self.rpsbml, reaction)
+        self._addReactionEdges(reaction)
+
+
+    def _addSpecies(self, species_id):
+        """Private function that adds a species created after the reactions of the graph that use it, and its edges
+
+        :param species_id: The id of the species
+
+        :type species_id: str
+
+        :return: None
+        :rtype: None
+        """
+        if species_id in self.G:
+            return
+        reactions = [i for i in self.reactions if species_id in [y.species for y in list(i.getListOfReactants())+list(i.getListOfProducts())]]
+        spe = self.rpsbml.model.getSpecies(species_id)
+        if not reactions or not spe:
+            return
+        self.logger.debug('Adding species '+str(species_id)+' to the graph')
+        self.species.append(spe)
+        self._addSpeciesNode(spe)
+        for reaction in reactions:
+            self._addReactionEdges(reaction, species_id)
+
+
+    def _onModelChange(self, event, element_id, group_id=None):
+        """Private function called by rpSBML when the model changes, that updates the graph
+
+        :param event: The type of change
+        :param element_id: The id of the changed element
+        :param group_id: The id of the group for the group_member_added event
+
+        :type event: str
+        :type element_id: str
+        :type group_id: str
+
+        :return: None
+        :rtype: None
+        """
+        if event=='group_member_added':
+            if group_id in self.pathway_members:
+                self.pathway_members[group_id].add(element_id)
+                self._addReaction(element_id)
+            elif group_id==self.species_group_id:
+                self._central_ids.add(element_id)
+                if element_id in self.G:
+                    self.G.add_node(element_id, central_species=True)
+        elif event=='group_member_removed' or event=='species_removed':
+            if event=='species_removed' or group_id==self.species_group_id:
+                self._central_ids.discard(element_id)
+                if element_id in self.G:
+                    self.G.nodes[element_id]['central_species'] = False
+        elif event=='reaction_created':
+            if any([element_id in i for i in self.pathway_members.values()]):
+                self._addReaction(element_id)
+        elif event=='species_created':
+            self._addSpecies(element_id)
+        elif event=='annotation_updated':
+            if element_id in self.G:
+                self.G.nodes[element_id].resetAnnotation()
+            elif element_id in self.pathway_brsynth:
+                rp_pathway = self.rpsbml.model.getPlugin('groups').getGroup(element_id)
+                self.pathway_brsynth[element_id] = self.rpsbml.readBRSYNTHAnnotation(rp_pathway.getAnnotation())
+                if element_id==list(self.pathway_brsynth)[0]:
+                    self.G.graph['brsynth'] = self.pathway_brsynth[element_id]
+
+
+    def unbind(self):
+        """Stop listening to the changes of the model
+
+        :return: None
+        :rtype: None
+        """
+        self.rpsbml.removeListener(self._onModelChange)
+
+
+    ######################## Multiple pathways ##########################
+
+
+    def pathwayView(self, pathway_id):
+        """Return the view of a single pathway of the graph
+
+        The view shares the nodes and edges of the graph and only filters the reactions of the pathway and their species.
+        It has its own ordering, sources and sinks. Views are cached
+
+        :param pathway_id: The id of the pathway
+
+        :type pathway_id: str
+
+        :raises KeyError: If the pathway is not part of the graph
+
+        :return: The view of the pathway
+        :rtype: rpGraphView
+        """
+        if not pathway_id in self.pathway_members:
+            self.logger.error('The pathway '+str(pathway_id)+' is not part of the graph: '+str(list(self.pathway_members)))
+            raise KeyError(pathway_id)
+        if not pathway_id in self._views:
+            self._views[pathway_id] = rpGraphView(self, pathway_id)
+        return self._views[pathway_id]
+
+
+    def pathwayViews(self):
+        """Return the views of all the pathways of the graph
+
+        :return: Dictionnary of the pathway id to its view
+        :rtype: dict
+        """
+        return {pathway_id: self.pathwayView(pathway_id) for pathway_id in self.pathway_members}
+
+
+    def _speciesClassification(self):
+        """Private function that classifies all the species nodes in a single pass
+
+        Species that are consumed but never produced are sources, and species that are produced but never consumed
+        are sinks. The classification is cached until the graph changes
+
+        :return: Dictionnary of lists of node ids with the keys: sources, central_sources, sinks, central_sinks
+        :rtype: dict
+        """
+        self._checkCache()
+        if self._species_classes is None:
+            species_classes = {'sources': [], 'central_sources': [], 'sinks': [], 'central_sinks': []}
+            for node_name, node in self.G.nodes(data=True):
+                if not node['type']=='species':
+                    continue
+                in_degree = self.G.in_degree(node_name)
+                out_degree = self.G.out_degree(node_name)
+                if out_degree>0 and in_degree==0:
+                    species_classes['sources'].append(node_name)
+                    if node['central_species']==True:
+                        species_classes['central_sources'].append(node_name)
+                elif out_degree==0 and in_degree>0:
+                    species_classes['sinks'].append(node_name)
+                    if node['central_species']==True:
+                        species_classes['central_sinks'].append(node_name)
+            self._species_classes = species_classes
+        return self._species_classes
 
 
     def _onlyConsumedSpecies(self):
@@ -88,13 +472,7 @@ class rpGraph:
         :return: List of node ids
         :rtype: list
         """
-        only_consumed_species = []
-        for node_name in self.G.nodes():
-            node = self.G.node.get(node_name)
-            if node['type']=='species':
-                if not len(list(self.G.successors(node_name)))==0 and len(list(self.G.predecessors(node_name)))==0:
-                    only_consumed_species.append(node_name)
-        return only_consumed_species
+        return list(self._speciesClassification()['sources'])
 
 
     def _onlyConsumedCentralSpecies(self):
@@ -103,14 +481,7 @@ class rpGraph:
         :return: List of node ids
         :rtype: list
         """
-        only_consumed_species = []
-        for node_name in self.G.nodes():
-            node = self.G.node.get(node_name)
-            if node['type']=='species':
-                if node['central_species']==True:
-                    if not len(list(self.G.successors(node_name)))==0 and len(list(self.G.predecessors(node_name)))==0:
-                        only_consumed_species.append(node_name)
-        return only_consumed_species
+        return list(self._speciesClassification()['central_sources'])
 
 
     def _onlyProducedSpecies(self):
@@ -119,13 +490,7 @@ class rpGraph:
         :return: List of node ids
         :rtype: list
         """
-        only_produced_species = []
-        for node_name in self.G.nodes():
-            node = self.G.node.get(node_name)
-            if node['type']=='species':
-                if len(list(self.G.successors(node_name)))==0 and len(list(self.G.predecessors(node_name)))>0:
-                    only_produced_species.append(node_name)
-        return only_produced_species
+        return list(self._speciesClassification()['sinks'])
 
 
     def _onlyProducedCentralSpecies(self):
@@ -134,67 +499,616 @@ class rpGraph:
         :return: List of node ids
         :rtype: list
         """
-        only_produced_species = []
-        for node_name in self.G.nodes():
-            node = self.G.node.get(node_name)
-            if node['type']=='species':
-                if node['central_species']==True:
-                    if len(list(self.G.successors(node_name)))==0 and len(list(self.G.predecessors(node_name)))>0:
-                        only_produced_species.append(node_name)
-        return only_produced_species
+        return list(self._speciesClassification()['central_sinks'])
+
+
+    def sources(self, central=False):
+        """Public function to return the species that are consumed but never produced
+
+        :param central: Only return the central species (Default: False)
 
+        :type central: bool
 
-    def _recursiveReacPredecessors(self, node_name, reac_list):
-        """Return the next linear predecessors
+        :return: List of node ids
+        :rtype: list
+        """
+        if central:
+            return self._onlyConsumedCentralSpecies()
+        return self._onlyConsumedSpecies()
 
-        Better than before, however bases itself on the fact that central species do not have multiple predesessors
-        if that is the case then the algorithm will return badly ordered reactions
 
-        :param node_name: The id of the starting node
-        :param reac_list: The list of reactions that already have been run
+    def sinks(self, central=False):
+        """Public function to return the species that are produced but never consumed
 
-        :type node_name: str
-        :type reac_list: list
+        :param central: Only return the central species (Default: False)
+
+        :type central: bool
 
         :return: List of node ids
         :rtype: list
         """
-        self.logger.debug('-------- '+str(node_name)+' --> '+str(reac_list)+' ----------')
-        pred_node_list = [i for i in self.G.predecessors(node_name)]
-        self.logger.debug(pred_node_list)
-        if pred_node_list==[]:
-            return reac_list
-        for n_n in pred_node_list:
-            n = self.G.node.get(n_n)
-            if n['type']=='reaction':
-                if n_n in reac_list:
-                    return reac_list
-                else:
-                    reac_list.append(n_n)
-                    self._recursiveReacPredecessors(n_n, reac_list)
-            elif n['type']=='species':
-                if n['central_species']==True:
-                    self._recursiveReacPredecessors(n_n, reac_list)
-                else:
-                    return reac_list
-        return reac_list
+        if central:
+            return self._onlyProducedCentralSpecies()
+        return self._onlyProducedSpecies()
+
+
+    def _centralReactionGraph(self):
+        """Private function that returns the projection of the graph on the reactions through the central species
+
+        There is an edge between two reactions if the first produces a central species that is consumed by the second.
+        The projection is computed once and cached
+
+        :return: The reaction graph
+        :rtype: networkx.DiGraph
+        """
+        self._checkCache()
+        if self._reaction_graph is None:
+            reaction_graph = nx.DiGraph()
+            reaction_graph.add_nodes_from([i for i, d in self.G.nodes(data=True) if d['type']=='reaction'])
+            for node_name, node in self.G.nodes(data=True):
+                if node['type']=='species' and node['central_species']==True:
+                    for pred_reac in self.G.predecessors(node_name):
+                        for succ_reac in self.G.successors(node_name):
+                            if not pred_reac==succ_reac:
+                                reaction_graph.add_edge(pred_reac, succ_reac)
+            self._reaction_graph = reaction_graph
+        return self._reaction_graph
 
 
     def orderedRetroReactions(self):
         """Public function to return the linear list of reactions
 
+        The reactions are ordered using a topological sort of the central species projection of the graph. For branched
+        pathways, where multiple orders are valid, ties are broken using the order of the members of the pathway group.
+        The result is cached
+
+        :return: List of node ids
+        :rtype: list
+        """
+        self._checkCache()
+        if self._ordered_reactions is None:
+            reaction_graph = self._centralReactionGraph()
+            if not nx.is_directed_acyclic_graph(reaction_graph):
+                self.logger.error('The pathway contains a cycle and cannot be ordered: '+str(nx.find_cycle(reaction_graph)))
+                self._ordered_reactions = []
+            else:
+                position = {reac.getId(): i for i, reac in enumerate(self.reactions)}
+                self._ordered_reactions = list(nx.lexicographical_topological_sort(reaction_graph, key=lambda x: position.get(x, -1)))
+                if not len(self._ordered_reactions)==self.num_reactions:
+                    self.logger.error('Could not find the full ordered reactions')
+                    self._ordered_reactions = []
+        return list(self._ordered_reactions)
+
+
+    def countReactionOrders(self, max_reactions=20):
+        """Public function to return the number of valid orders of the reactions
+
+        A linear pathway has a single valid order while branched pathways may have many. The count uses dynamic
+        programming over the subsets of reactions and is therefore limited to pathways of max_reactions reactions.
+        The result is cached
+
+        :param max_reactions: The maximal number of reactions to count the orders for (Default: 20)
+
+        :type max_reactions: int
+
+        :return: The number of valid orders, 0 if the pathway contains a cycle or None if the pathway is too large
+        :rtype: int
+        """
+        self._checkCache()
+        if self._num_orders is None:
+            reaction_graph = self._centralReactionGraph()
+            if not nx.is_directed_acyclic_graph(reaction_graph):
+                self.logger.error('The pathway contains a cycle and cannot be ordered')
+                return 0
+            nodes = list(reaction_graph.nodes)
+            if len(nodes)>max_reactions:
+                self.logger.warning('Too many reactions to count the valid orders: '+str(len(nodes)))
+                return None
+            index = {n: i for i, n in enumerate(nodes)}
+            pred_mask = [0]*len(nodes)
+            for u, v in reaction_graph.edges:
+                pred_mask[index[v]] |= 1<<index[u]
+            #num_orders[mask] is the number of valid orders of the reactions in mask
+            num_orders = [0]*(1<<len(nodes))
+            num_orders[0] = 1
+            for mask in range(1<<len(nodes)):
+                if num_orders[mask]==0:
+                    continue
+                for i in range(len(nodes)):
+                    if not mask & (1<<i) and pred_mask[i] & mask==pred_mask[i]:
+                        num_orders[mask | (1<<i)] += num_orders[mask]
+            self._num_orders = num_orders[-1]
+        return self._num_orders
+
+
+class rpGraphView(rpGraph):
+    """View of a single pathway of an rpGraph built over multiple pathways
+
+    Returned by rpGraph.pathwayView(). The view is a networkx subgraph view of the shared graph and is refreshed when the
+    shared graph changes
+    """
+    def __init__(self, parent, pathway_id):
+        """Constructor of the class
+
+        :param parent: The rpGraph built over multiple pathways
+        :param pathway_id: The id of the pathway
+
+        :type parent: rpGraph
+        :type pathway_id: str
+        """
+        self.rpsbml = parent.rpsbml
+        self.logger = logging.getLogger(__name__)
+        self.parent = parent
+        self.pathway_id = pathway_id
+        self.species_group_id = parent.species_group_id
+        self.G = None
+        self.species = None
+        self.reactions = None
+        self.num_reactions = 0
+        self.num_species = 0
+        self._reaction_graph = None
+        self._ordered_reactions = None
+        self._num_orders = None
+        self._species_classes = None
+        self._cache_version = None
+        self._checkCache()
+
+
+    def _checkCache(self):
+        """Private function that rebuilds the subgraph view and resets the cached results if the shared graph has changed
+
+        :return: None
+        :rtype: None
+        """
+        if not self._cache_version==self.parent.G.version:
+            members = self.parent.pathway_members[self.pathway_id]
+            self.reactions = [i for i in self.parent.reactions if i.getId() in members]
+            nodes = set([i.getId() for i in self.reactions])
+            for reac_id in list(nodes):
+                nodes.update(self.parent.G.predecessors(reac_id))
+                nodes.update(self.parent.G.successors(reac_id))
+            self.species = [i for i in self.parent.species if i.getId() in nodes]
+            self.G = self.parent.G.subgraph(nodes)
+            self.num_reactions = len(self.reactions)
+            self.num_species = len(self.species)
+            self._reaction_graph = None
+            self._ordered_reactions = None
+            self._num_orders = None
+            self._species_classes = None
+            self._cache_version = self.parent.G.version
+
+
+    def brsynth(self):
+        """Return the BRSynth annotation of the pathway
+
+        :return: Dictionary of the BRSynth annotation
+        :rtype: dict
+        """
+        return self.parent.pathway_brsynth[self.pathway_id]
+
+
+class rpGraphCSR(rpGraph):
+    """Compact graph of the species and reactions of a model stored as CSR adjacency arrays
+
+    Alternative to the networkx backend of rpGraph that is suited to whole models. The species are indexed first
+    (0 to num_species-1) followed by the reactions, and the successors (resp. predecessors) of node i are
+    indices[indptr[i]:indptr[i+1]] (resp. rindices[rindptr[i]:rindptr[i+1]])
+    """
+    def __init__(self, rpsbml, pathway_id=None, species_group_id='central_species', currency_species=CURRENCY_SPECIES):
+        """Constructor of the class
+
+        Automatically constructs the network when calling the construtor
+
+        :param rpsbml: The rpSBML object
+        :param pathway_id: The pathway id of the heterologous pathway. If None, the whole model is used (Default: None)
+        :param species_group_id: The id of the central species
+        :param currency_species: The species ids or MetaNetX ids of the currency metabolites (Default: CURRENCY_SPECIES)
+
+        :type rpsbml: rpSBML
+        :type pathway_id: str
+        :type species_group_id: str
+        :type currency_species: list
+        """
+        self.rpsbml = rpsbml
+        self.logger = logging.getLogger(__name__)
+        self.logger.debug('Started instance of rpGraphCSR')
+        self.pathway_id = pathway_id
+        self.species_group_id = species_group_id
+        self.currency_species = set(currency_species or [])
+        self.G = None
+        self.species = None
+        self.reactions = None
+        self.num_reactions = 0
+        self.num_species = 0
+        self.node_ids = []
+        self.node_index = {}
+        self.indptr = None
+        self.indices = None
+        self.stoichio = None
+        self.rindptr = None
+        self.rindices = None
+        self.is_central = None
+        self.is_currency = None
+        self._reaction_graph = None
+        self._ordered_reactions = None
+        self._num_orders = None
+        self._species_classes = None
+        self._cache_version = None
+        self._makeGraph(pathway_id, species_group_id)
+
+
+    def _makeGraph(self, pathway_id=None, species_group_id='central_species'):
+        """Private function that constructs the CSR adjacency arrays
+
+        :param pathway_id: The pathway id of the heterologous pathway. If None, the whole model is used
+        :param species_group_id: The id of the central species
+
+        :type pathway_id: str
+        :type species_group_id: str
+
+        :return: None
+        :rtype: None
+        """
+        groups = self.rpsbml.model.getPlugin('groups')
+        if pathway_id:
+            self.species = [self.rpsbml.model.getSpecies(i) for i in self.rpsbml.readUniqueRPspecies(pathway_id)]
+            self.reactions = [self.rpsbml.model.getReaction(i) for i in self.rpsbml.readRPpathwayIDs(pathway_id)]
+        else:
+            self.species = list(self.rpsbml.model.getListOfSpecies())
+            self.reactions = list(self.rpsbml.model.getListOfReactions())
+        self.num_species = len(self.species)
+        self.num_reactions = len(self.reactions)
+        self.node_ids = [i.getId() for i in self.species]+[i.getId() for i in self.reactions]
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        num_nodes = len(self.node_ids)
+        ######### flags ##########
+        self.is_central = np.zeros(num_nodes, dtype=bool)
+        central_group = groups.getGroup(species_group_id) if groups else None
+        if central_group:
+            for member in central_group.getListOfMembers():
+                if member.getIdRef() in self.node_index and self.node_index[member.getIdRef()]<self.num_species:
+                    self.is_central[self.node_index[member.getIdRef()]] = True
+        else:
+            self.logger.debug('Cannot find the species group: '+str(species_group_id))
+        self.is_currency = np.zeros(num_nodes, dtype=bool)
+        if self.currency_species:
+            for i, spe in enumerate(self.species):
+                if spe.getId() in self.currency_species or spe.getId().split('__64__')[0] in self.currency_species:
+                    self.is_currency[i] = True
+                    continue
+                miriam = self.rpsbml.readMIRIAMAnnotation(spe.getAnnotation())
+                if 'metanetx' in miriam and set(miriam['metanetx']) & self.currency_species:
+                    self.is_currency[i] = True
+        ######### edges ##########
+        src = []
+        dst = []
+        stoichio = []
+        for reac_index, reaction in enumerate(self.reactions, start=self.num_species):
+            for reac in reaction.getListOfReactants():
+                if reac.species in self.node_index:
+                    src.append(self.node_index[reac.species])
+                    dst.append(reac_index)
+                    stoichio.append(reac.stoichiometry)
+            for prod in reaction.getListOfProducts():
+                if prod.species in self.node_index:
+                    src.append(reac_index)
+                    dst.append(self.node_index[prod.species])
+                    stoichio.append(prod.stoichiometry)
+        src = np.array(src, dtype=np.int64)
+        dst = np.array(dst, dtype=np.int64)
+        stoichio = np.array(stoichio, dtype=float)
+        order = np.lexsort((dst, src))
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=num_nodes))))
+        self.indices = dst[order]
+        self.stoichio = stoichio[order]
+        rorder = np.lexsort((src, dst))
+        self.rindptr = np.concatenate(([0], np.cumsum(np.bincount(dst, minlength=num_nodes))))
+        self.rindices = src[rorder]
+
+
+    def _isReaction(self, index):
+        return index>=self.num_species
+
+
+    def successors(self, node_id):
+        """Return the successors of a node
+
+        :param node_id: The id of the node
+
+        :type node_id: str
+
+        :return: List of node ids
+        :rtype: list
+        """
+        i = self.node_index[node_id]
+        return [self.node_ids[y] for y in self.indices[self.indptr[i]:self.indptr[i+1]]]
+
+
+    def predecessors(self, node_id):
+        """Return the predecessors of a node
+
+        :param node_id: The id of the node
+
+        :type node_id: str
+
         :return: List of node ids
         :rtype: list
         """
-        #Note: may be better to loop tho
-        for prod_spe in self._onlyProducedSpecies():
-            self.logger.debug('Testing '+str(prod_spe))
-            ordered = self._recursiveReacPredecessors(prod_spe, [])
-            self.logger.debug(ordered)
-            if len(ordered)==self.num_reactions:
-                return [i for i in reversed(ordered)]
-        self.logger.error('Could not find the full ordered reactions')
-        return []
+        i = self.node_index[node_id]
+        return [self.node_ids[y] for y in self.rindices[self.rindptr[i]:self.rindptr[i+1]]]
+
+
+    def _speciesDegreeFilter(self, only_central, is_produced):
+        """Private function that returns the species that are only consumed or only produced
+
+        :param only_central: Only return the central species
+        :param is_produced: Return the only produced species if True and the only consumed if False
+
+        :type only_central: bool
+        :type is_produced: bool
+
+        :return: List of node ids
+        :rtype: list
+        """
+        out_degree = np.diff(self.indptr)[:self.num_species]
+        in_degree = np.diff(self.rindptr)[:self.num_species]
+        if is_produced:
+            mask = np.logical_and(out_degree==0, in_degree>0)
+        else:
+            mask = np.logical_and(out_degree>0, in_degree==0)
+        if only_central:
+            mask = np.logical_and(mask, self.is_central[:self.num_species])
+        return [self.node_ids[i] for i in np.flatnonzero(mask)]
+
+
+    def _onlyConsumedSpecies(self):
+        """Private function that returns the single parent species that are consumed only
+
+        :return: List of node ids
+        :rtype: list
+        """
+        return self._speciesDegreeFilter(False, False)
+
+
+    def _onlyConsumedCentralSpecies(self):
+        """Private function that returns the single parent central consumed species
+
+        :return: List of node ids
+        :rtype: list
+        """
+        return self._speciesDegreeFilter(True, False)
+
+
+    def _onlyProducedSpecies(self):
+        """Private function that returns the single parent produced species
+
+        :return: List of node ids
+        :rtype: list
+        """
+        return self._speciesDegreeFilter(False, True)
+
+
+    def _onlyProducedCentralSpecies(self):
+        """Private function that returns the single parent produced central species
+
+        :return: List of node ids
+        :rtype: list
+        """
+        return self._speciesDegreeFilter(True, True)
+
+
+    def _centralReactionGraph(self):
+        """Private function that returns the projection of the graph on the reactions through the central species
+
+        :return: The reaction graph
+        :rtype: networkx.DiGraph
+        """
+        if self._reaction_graph is None:
+            reaction_graph = nx.DiGraph()
+            reaction_graph.add_nodes_from(self.node_ids[self.num_species:])
+            for i in np.flatnonzero(self.is_central[:self.num_species]):
+                preds = self.rindices[self.rindptr[i]:self.rindptr[i+1]]
+                succs = self.indices[self.indptr[i]:self.indptr[i+1]]
+                for pred_reac in preds:
+                    for succ_reac in succs:
+                        if not pred_reac==succ_reac:
+                            reaction_graph.add_edge(self.node_ids[pred_reac], self.node_ids[succ_reac])
+            self._reaction_graph = reaction_graph
+        return self._reaction_graph
+
+
+    def _searchNodes(self, source_ids, target_ids, ignore_currency):
+        """Private function that returns the indices of the sources and targets of a search and the mask of blocked nodes
+
+        :param source_ids: The ids of the source nodes
+        :param target_ids: The ids of the target nodes
+        :param ignore_currency: Block the currency species that are not sources or targets
+
+        :type source_ids: list
+        :type target_ids: list
+        :type ignore_currency: bool
+
+        :return: Tuple of the source indices, the target indices and the blocked mask
+        :rtype: tuple
+        """
+        sources = np.array([self.node_index[i] for i in source_ids if i in self.node_index], dtype=np.int64)
+        targets = np.array([self.node_index[i] for i in target_ids if i in self.node_index], dtype=np.int64)
+        if len(sources)==0 or len(targets)==0:
+            self.logger.warning('Cannot find the source or target nodes in the graph')
+        blocked = np.zeros(len(self.node_ids), dtype=bool)
+        if ignore_currency:
+            blocked = self.is_currency.copy()
+            blocked[sources] = False
+            blocked[targets] = False
+        return sources, targets, blocked
+
+
+    def _expandFrontier(self, frontier, indptr, indices):
+        """Private function that returns all the neighbours of a set of nodes at once
+
+        :param frontier: The indices of the nodes
+        :param indptr: The CSR index pointer array (successors or predecessors)
+        :param indices: The CSR indices array (successors or predecessors)
+
+        :type frontier: numpy.array
+        :type indptr: numpy.array
+        :type indices: numpy.array
+
+        :return: Tuple of the neighbours and, for each of them, the node of the frontier it was reached from
+        :rtype: tuple
+        """
+        starts = indptr[frontier]
+        counts = indptr[frontier+1]-starts
+        offsets = np.repeat(starts-np.cumsum(counts)+counts, counts)+np.arange(counts.sum())
+        return indices[offsets], np.repeat(frontier, counts)
+
+
+    def _distanceTo(self, targets, blocked, max_length):
+        """Private function that returns the number of edges from every node to the closest target
+
+        Breadth first search on the predecessors of the targets
+
+        :param targets: The indices of the targets
+        :param blocked: The mask of the nodes that cannot be passed through
+        :param max_length: The maximal distance to search
+
+        :type targets: numpy.array
+        :type blocked: numpy.array
+        :type max_length: int
+
+        :return: The distances, where the nodes that cannot reach a target within max_length have a distance of max_length+1
+        :rtype: numpy.array
+        """
+        distance = np.full(len(self.node_ids), max_length+1, dtype=np.int64)
+        distance[targets] = 0
+        frontier = targets
+        length = 0
+        while len(frontier)>0 and length<max_length:
+            neighbours, parents = self._expandFrontier(frontier, self.rindptr, self.rindices)
+            neighbours = np.unique(neighbours[np.logical_and(distance[neighbours]>length+1, ~blocked[neighbours])])
+            length += 1
+            distance[neighbours] = length
+            frontier = neighbours
+        return distance
+
+
+    def shortestPath(self, source_ids, target_ids, ignore_currency=True, max_length=None):
+        """Return the shortest path from any of the source species to any of the target species
+
+        Breadth first search on the species-reaction bipartite graph, where each level of the search is expanded at once.
+        The currency species (other than the sources and the targets) can be excluded from the search
+
+        :param source_ids: The ids of the source nodes (ex: the pathway precursors)
+        :param target_ids: The ids of the target nodes (ex: chassis metabolites)
+        :param ignore_currency: Do not go through the currency species (Default: True)
+        :param max_length: The maximal number of edges of the path (Default: None)
+
+        :type source_ids: list
+        :type target_ids: list
+        :type ignore_currency: bool
+        :type max_length: int
+
+        :return: List of the node ids of the path (alternating species and reactions) or empty list if there is none
+        :rtype: list
+        """
+        sources, targets, blocked = self._searchNodes(source_ids, target_ids, ignore_currency)
+        if len(sources)==0 or len(targets)==0:
+            return []
+        num_nodes = len(self.node_ids)
+        is_target = np.zeros(num_nodes, dtype=bool)
+        is_target[targets] = True
+        parent = np.full(num_nodes, -1, dtype=np.int64)
+        visited = np.zeros(num_nodes, dtype=bool)
+        visited[sources] = True
+        hit = sources[is_target[sources]]
+        frontier = sources
+        length = 0
+        while len(hit)==0 and len(frontier)>0:
+            if max_length is not None and length>=max_length:
+                break
+            neighbours, parents = self._expandFrontier(frontier, self.indptr, self.indices)
+            if len(neighbours)==0:
+                break
+            keep = np.logical_and(~visited[neighbours], ~blocked[neighbours])
+            neighbours, first = np.unique(neighbours[keep], return_index=True)
+            parent[neighbours] = parents[keep][first]
+            visited[neighbours] = True
+            frontier = neighbours
+            hit = neighbours[is_target[neighbours]]
+            length += 1
+        if len(hit)==0:
+            return []
+        path = [hit[0]]
+        while not parent[path[-1]]==-1:
+            path.append(parent[path[-1]])
+        return [self.node_ids[i] for i in reversed(path)]
+
+
+    def alternativePaths(self, source_ids, target_ids, max_length=10, max_results=10, ignore_currency=True):
+        """Enumerate the routes from the source species to the target species by increasing length
+
+        Generator of the simple paths of the species-reaction bipartite graph, the shortest first. Paths of a given
+        length are enumerated with an iterative depth first search that only extends the nodes that can still reach a
+        target within the length, so that the memory used is the size of the graph plus the current path. The paths stop
+        at the first target that is reached and never go through currency species (if ignore_currency is True)
+
+        :param source_ids: The ids of the source species (ex: the pathway precursors)
+        :param target_ids: The ids of the target species (ex: the pathway target)
+        :param max_length: The maximal number of edges of the paths (a reaction step is 2 edges) (Default: 10)
+        :param max_results: The maximal number of paths to return (Default: 10)
+        :param ignore_currency: Do not go through the currency species (Default: True)
+
+        :type source_ids: list
+        :type target_ids: list
+        :type max_length: int
+        :type max_results: int
+        :type ignore_currency: bool
+
+        :return: Generator of lists of the node ids of the paths (alternating species and reactions)
+        :rtype: generator
+        """
+        sources, targets, blocked = self._searchNodes(source_ids, target_ids, ignore_currency)
+        if len(sources)==0 or len(targets)==0:
+            return
+        is_target = np.zeros(len(self.node_ids), dtype=bool)
+        is_target[targets] = True
+        distance = self._distanceTo(targets, blocked, max_length)
+        sources = [i for i in sources if distance[i]<=max_length and not is_target[i]]
+        if not sources:
+            return
+        num_results = 0
+        on_path = np.zeros(len(self.node_ids), dtype=bool)
+        for length in range(int(min([distance[i] for i in sources])), max_length+1):
+            for source in sources:
+                if distance[source]>length:
+                    continue
+                #each entry of the stack is the node and the position of its next successor to visit
+                path = [source]
+                stack = [self.indptr[source]]
+                on_path[source] = True
+                while stack:
+                    node = path[-1]
+                    ptr = stack[-1]
+                    if ptr>=self.indptr[node+1]:
+                        stack.pop()
+                        on_path[path.pop()] = False
+                        continue
+                    stack[-1] = ptr+1
+                    succ = self.indices[ptr]
+                    depth = len(path)
+                    if on_path[succ] or blocked[succ] or depth+distance[succ]>length:
+                        continue
+                    if is_target[succ]:
+                        if depth==length:
+                            yield [self.node_ids[i] for i in path]+[self.node_ids[succ]]
+                            num_results += 1
+                            if num_results>=max_results:
+                                on_path[path] = False
+                                return
+                        continue
+                    path.append(succ)
+                    stack.append(self.indptr[succ])
+                    on_path[succ] = True
 
 
     ################################################# BELOW IS DEV ################################
@@ -0,0 +1,143 @@
+"""rpInterchange
+.. moduleauthor:: Melchior du Lac
+"""
+
+
+import os
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+## @package rpInterchange
+# Serialisation of the interchange representation of rpSBML models
+#
+# The interchange representation (see rpSBML.genInterchange) holds the species, reactions, stoichiometry, bounds,
+# groups and annotations of a model as typed fields. It is encoded in JSON (using orjson if it is installed) or in
+# msgpack (if it is installed) so that the different tools of the pipeline can exchange models without parsing and
+# writing SBML. This module does not depend on libSBML; use rpSBML.readInterchange to convert back to SBML.
+
+
+logger = logging.getLogger(__name__)
+
+
+FORMATS = ('json', 'msgpack')
+
+
+def dumps(data, fmt='json'):
+    """Encode the interchange representation of a model
+
+    :param data: The interchange representation (as returned by rpSBML.genInterchange)
+    :param fmt: The encoding, either json or msgpack (Default: json)
+
+    :type data: dict
+    :type fmt: str
+
+    :raises ValueError: If the format is not valid or msgpack is not installed
+
+    :return: The encoded model
+    :rtype: bytes
+    """
+    if fmt=='json':
+        if orjson:
+            return orjson.dumps(data)
+        return json.dumps(data, separators=(',', ':')).encode('utf-8')
+    elif fmt=='msgpack':
+        if not msgpack:
+            logger.error('msgpack is not installed')
+            raise ValueError
+        return msgpack.packb(data, use_bin_type=True)
+    logger.error('The format must be one of '+str(FORMATS)+' not '+str(fmt))
+    raise ValueError
+
+
+def loads(content):
+    """Decode the interchange representation of a model
+
+    The encoding is detected from the content: JSON documents start with {, msgpack maps never do
+
+    :param content: The encoded model
+
+    :type content: bytes
+
+    :raises ValueError: If the content is msgpack and msgpack is not installed
+
+    :return: The interchange representation
+    :rtype: dict
+    """
+    if content[:1] in (b'{', '{'):
+        if orjson:
+            return orjson.loads(content)
+        return json.loads(content)
+    if not msgpack:
+        logger.error('The content is not JSON and msgpack is not installed')
+        raise ValueError
+    return msgpack.unpackb(content, raw=False, strict_map_key=False)
+
+
+def writeInterchange(data, path, fmt=None):
+    """Write the interchange representation of a model to a file
+
+    :param data: The interchange representation (as returned by rpSBML.genInterchange)
+    :param path: The path of the output file
+    :param fmt: The encoding, either json or msgpack (Default: None, msgpack if the file extension is .msgpack or .mpk and json otherwise)
+
+    :type data: dict
+    :type path: str
+    :type fmt: str
+
+    :return: None
+    :rtype: None
+    """
+    if fmt==None:
+        fmt = 'msgpack' if os.path.splitext(path)[1] in ('.msgpack', '.mpk') else 'json'
+    with open(path, 'wb') as out_file:
+        out_file.write(dumps(data, fmt))
+
+
+def readInterchange(path):
+    """Read the interchange representation of a model from a file
+
+    :param path: The path of the file
+
+    :type path: str
+
+    :raises FileNotFoundError: If the file cannot be found
+
+    :return: The interchange representation
+    :rtype: dict
+    """
+    if not os.path.isfile(path):
+        logger.error('Invalid input file: '+str(path))
+        raise FileNotFoundError
+    with open(path, 'rb') as in_file:
+        return loads(in_file.read())
+
+
+def pathwayReactions(data, pathway_id='rp_pathway'):
+    """Return the reactions of a pathway of the interchange representation
+
+    :param data: The interchange representation
+    :param pathway_id: The pathway ID (Default: rp_pathway)
+
+    :type data: dict
+    :type pathway_id: str
+
+    :return: List of the reaction entries of the pathway in the order of the group members
+    :rtype: list
+    """
+    reactions = {i['id']: i for i in data['reactions']}
+    for group in data['groups']:
+        if group['id']==pathway_id:
+            return [reactions[i] for i in group['members'] if i in reactions]
+    logger.warning('The pathway_id '+str(pathway_id)+' does not exist in the model')
+    return []
@@ -1,4 +1,5 @@
 import numpy as np
+from scipy import sparse
 import tempfile
 import logging
 import pandas as pd
@@ -220,132 +221,220 @@ class rpMerge:
     ##########################################################################################
 
 
-    # TODO: need to remove from the list reactions simulated reactions that have matched
-    # TODO: Remove. This assumes that reactions can match multiple times, when in fact its impossible
-    def compareReactions(self, species_match, target_rpsbml, source_rpsbml):
+    def _reactionIncidence(self, rpsbml, species_index, species_conv=None):
+        """Private function that builds the sparse reactants and products incidence matrices of the reactions of a model
+
+        The columns of the matrices are the species of species_index. If species_conv is passed, the species of the model
+        are first converted to their matched species (and the match score is used as the value of the entry). Species that
+        cannot be converted are not part of the matrix but are counted in the size of the reaction side
+
+        :param rpsbml: The rpSBML object
+        :param species_index: Dictionnary of the species id to column index
+        :param species_conv: Dictionnary of the species conversion, where the value is a tuple of the converted species id and its score (Default: None)
+
+        :type rpsbml: rpSBML
+        :type species_index: dict
+        :type species_conv: dict
+
+        :return: Tuple of the reaction ids, reactants and products matrices, and the number of reactants and products of each reaction
+        :rtype: tuple
+        """
+        reaction_ids = []
+        sides = {'reactants': ([], [], []), 'products': ([], [], [])}
+        sizes = {'reactants': [], 'products': []}
+        for row, reaction in enumerate(rpsbml.model.getListOfReactions()):
+            reaction_ids.append(reaction.getId())
+            for side, list_of in [('reactants', reaction.getListOfReactants()), ('products', reaction.getListOfProducts())]:
+                #a reaction should not contain the same species twice, but keep the best if it does
+                entries = {}
+                spe_ids = set([i.species for i in list_of])
+                for spe_id in spe_ids:
+                    if species_conv is None:
+                        conv_id, spe_score = spe_id, 1.0
+                    elif spe_id in species_conv:
+                        conv_id, spe_score = species_conv[spe_id]
+                    else:
+                        continue
+                    if conv_id in species_index and spe_score>entries.get(conv_id, 0.0):
+                        entries[conv_id] = spe_score
+                rows, cols, data = sides[side]
+                for conv_id in entries:
+                    rows.append(row)
+                    cols.append(species_index[conv_id])
+                    data.append(entries[conv_id])
+                sizes[side].append(len(spe_ids))
+        shape = (len(reaction_ids), len(species_index))
+        reactants = sparse.csr_matrix((sides['reactants'][2], (sides['reactants'][0], sides['reactants'][1])), shape=shape)
+        products = sparse.csr_matrix((sides['products'][2], (sides['products'][0], sides['products'][1])), shape=shape)
+        return reaction_ids, reactants, products, np.array(sizes['reactants'], dtype=float), np.array(sizes['products'], dtype=float)
+
+
+    def _ecIncidence(self, rpsbml, prefix_index):
+        """Private function that builds, for each EC level, the sparse incidence matrix of the reactions and their EC number prefixes
+
+        :param rpsbml: The rpSBML object
+        :param prefix_index: List of 4 dictionnaries (one per EC level) of the prefix to column index. Updated in place
+
+        :type rpsbml: rpSBML
+        :type prefix_index: list
+
+        :return: List of the 4 EC level incidence matrices
+        :rtype: list
+        """
+        entries = [([], []) for i in range(4)]
+        num_reactions = 0
+        for row, reaction in enumerate(rpsbml.model.getListOfReactions()):
+            num_reactions += 1
+            miriam = rpsbml.readMIRIAMAnnotation(reaction.getAnnotation())
+            if not 'ec-code' in miriam:
+                continue
+            for ec in miriam['ec-code']:
+                frac_ec = [y for y in ec.split('.') if not y=='-']
+                for level in range(min(len(frac_ec), 4)):
+                    prefix = '.'.join(frac_ec[:level+1])
+                    if not prefix in prefix_index[level]:
+                        prefix_index[level][prefix] = len(prefix_index[level])
+                    entries[level][0].append(row)
+                    entries[level][1].append(prefix_index[level][prefix])
+        to_ret = []
+        for level in range(4):
+            mat = sparse.csr_matrix((np.ones(len(entries[level][0])), (entries[level][0], entries[level][1])),
+                                    shape=(num_reactions, len(prefix_index[level])))
+            #multiple EC numbers of the same reaction can share a prefix
+            mat.data[:] = 1.0
+            to_ret.append(mat)
+        return to_ret
+
+
+    def reactionScoreMatrix(self, species_match, target_rpsbml, source_rpsbml, ec_weight=0.0):
+        """Compute the sparse similarity matrix between the reactions of two SBML files
+
+        Only the pairs of reactions that share at least one matched species are scored. For these, the weighted Jaccard
+        index of the reactants and of the products are calculated (the weights being the species match scores) and the
+        species score is their mean. The EC score is 0.25 per level of the EC number prefix that is shared (best over all the
+        EC numbers of the two reactions). The final score is: (1-ec_weight)*species_score+ec_weight*ec_score
+
+        :param species_match: The species match dictionary returned by compareSpecies()
+        :param target_rpsbml: The target rpSBMl object
+        :param source_rpsbml: The source rpSBML object
+        :param ec_weight: The weight of the EC score in the final score (Default: 0.0)
+
+        :type species_match: dict
+        :type target_rpsbml: rpSBML
+        :type source_rpsbml: rpSBML
+        :type ec_weight: float
+
+        :return: Tuple of the score matrix (target reactions as rows and source reactions as columns), the target reaction ids, the source reaction ids and the dictionnary of the sparse matrices of the individual scores (reactants_score, products_score, species_score, ec_score and found)
+        :rtype: tuple
+        """
+        species_index = {spe.getId(): i for i, spe in enumerate(target_rpsbml.model.getListOfSpecies())}
+        #take the best match of each source species
+        species_conv = {}
+        for source_spe in species_match:
+            if species_match[source_spe]:
+                best_spe = sorted(species_match[source_spe].items(), key=lambda item: item[1], reverse=True)[0]
+                species_conv[source_spe] = best_spe
+        target_ids, target_rea, target_pro, target_rea_size, target_pro_size = self._reactionIncidence(target_rpsbml, species_index)
+        source_ids, source_rea, source_pro, source_rea_size, source_pro_size = self._reactionIncidence(source_rpsbml, species_index, species_conv)
+        shape = (len(target_ids), len(source_ids))
+        ########## candidate pairs ###########
+        target_all = target_rea+target_pro
+        target_all.data[:] = 1.0
+        source_all = source_rea+source_pro
+        source_all.data[:] = 1.0
+        candidates = (target_all @ source_all.T).tocoo()
+        rows, cols = candidates.row, candidates.col
+        self.logger.debug('Scoring '+str(len(rows))+' candidate reaction pairs out of '+str(shape[0]*shape[1]))
+        ########## Jaccard #################
+        def _jaccard(target_side, source_side, target_size, source_size):
+            source_bin = source_side.copy()
+            source_bin.data[:] = 1.0
+            inter_w = np.asarray((target_side @ source_side.T)[rows, cols]).ravel()
+            inter_n = np.asarray((target_side @ source_bin.T)[rows, cols]).ravel()
+            union = target_size[rows]+source_size[cols]-inter_n
+            jac = np.divide(inter_w, union, out=np.zeros(len(rows)), where=union>0)
+            return jac, inter_n
+        reactants_score, reactants_inter = _jaccard(target_rea, source_rea, target_rea_size, source_rea_size)
+        products_score, products_inter = _jaccard(target_pro, source_pro, target_pro_size, source_pro_size)
+        species_score = (reactants_score+products_score)/2.0
+        found = np.logical_and(reactants_inter==source_rea_size[cols], products_inter==source_pro_size[cols])
+        ########## EC ######################
+        prefix_index = [{} for i in range(4)]
+        target_ec = self._ecIncidence(target_rpsbml, prefix_index)
+        source_ec = self._ecIncidence(source_rpsbml, prefix_index)
+        ec_score = np.zeros(len(rows))
+        for level in range(4):
+            #the number of columns grows when reading the source model
+            tar = target_ec[level]
+            tar.resize((tar.shape[0], len(prefix_index[level])))
+            sou = source_ec[level]
+            ec_score += 0.25*(np.asarray((tar @ sou.T)[rows, cols]).ravel()>0)
+        score = (1.0-ec_weight)*species_score+ec_weight*ec_score
+        def _toSparse(values):
+            mat = sparse.csr_matrix((values.astype(float), (rows, cols)), shape=shape)
+            mat.eliminate_zeros()
+            return mat
+        details = {'reactants_score': _toSparse(reactants_score),
+                   'products_score': _toSparse(products_score),
+                   'species_score': _toSparse(species_score),
+                   'ec_score': _toSparse(ec_score),
+                   'found': _toSparse(found)}
+        return _toSparse(score), target_ids, source_ids, details
+
+
+    def compareReactions(self, species_match, target_rpsbml, source_rpsbml, ec_weight=0.0):
         """Compare the reactions of two SBML files
 
         Compare that all the measured species of a reactions are found within sim species to match with a reaction.
-        We assume that there cannot be two reactions that have the same species and reactants. This is maintained by SBML
+        We assume that there cannot be two reactions that have the same species and reactants. This is maintained by SBML.
+        The scores are calculated by reactionScoreMatrix() and only the pairs of reactions with a non-zero score are passed
+        to the unique match
 
         :param species_match: The species match dictionary returned by compareSpecies()
         :param target_rpsbml: The target rpSBMl object
         :param source_rpsbml: The source rpSBML object
+        :param ec_weight: The weight of the EC score in the reaction score (Default: 0.0)
 
         :type species_match: dict 
         :type target_rpsbml: rpSBML
         :type source_rpsbml: rpSBML
+        :type ec_weight: float
 
         :return: The dictionary of the reaction matches
         :rtype: dict
         """
-        ############## compare the reactions #######################
-        #construct sim reactions with species
         self.logger.debug('------ Comparing reactions --------')
-        #match the reactants and products conversion to sim species
-        tmp_reaction_match = {}
-        source_target = {}
-        target_source = {}
-        for source_reaction in source_rpsbml.model.getListOfReactions():
-            source_reaction_miriam = source_rpsbml.readMIRIAMAnnotation(source_reaction.getAnnotation())
-            ################ construct the dict transforming the species #######
-            source_target[source_reaction.getId()] = {}
-            tmp_reaction_match[source_reaction.getId()] = {}
-            for target_reaction in target_rpsbml.model.getListOfReactions():
-                if not target_reaction.getId() in target_source:
-                    target_source[target_reaction.getId()] = {}
-                target_source[target_reaction.getId()][source_reaction.getId()] = {}
-                source_target[source_reaction.getId()][target_reaction.getId()] = {}
-                self.logger.debug('\t=========== '+str(target_reaction.getId())+' ==========')
-                self.logger.debug('\t+++++++ Species match +++++++')
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()] = {'reactants': {},
-                                                                             'reactants_score': 0.0,
-                                                                             'products': {},
-                                                                             'products_score': 0.0,
-                                                                             'species_score': 0.0,
-                                                                             'species_std': 0.0,
-                                                                             'species_reaction': None,
-                                                                             'ec_score': 0.0,
-                                                                             'ec_reaction': None,
-                                                                             'score': 0.0,
-                                                                             'found': False}
-                target_reaction = target_rpsbml.model.getReaction(target_reaction.getId())
-                sim_reactants_id = [reactant.species for reactant in target_reaction.getListOfReactants()]
-                sim_products_id = [product.species for product in target_reaction.getListOfProducts()]
-                ############ species ############
-                self.logger.debug('\tspecies_match: '+str(species_match))
-                self.logger.debug('\tspecies_match: '+str(species_match.keys()))
-                self.logger.debug('\tsim_reactants_id: '+str(sim_reactants_id))
-                self.logger.debug('\tmeasured_reactants_id: '+str([i.species for i in source_reaction.getListOfReactants()]))
-                self.logger.debug('\tsim_products_id: '+str(sim_products_id))
-                self.logger.debug('\tmeasured_products_id: '+str([i.species for i in source_reaction.getListOfProducts()]))
-                #ensure that the match is 1:1
-                #1)Here we assume that a reaction cannot have twice the same species
-                cannotBeSpecies = []
-                #if there is a match then we loop again since removing it from the list of potential matches would be appropriate
-                keep_going = True
-                while keep_going:
-                    self.logger.debug('\t\t----------------------------')
-                    keep_going = False
-                    for reactant in source_reaction.getListOfReactants():
-                        self.logger.debug('\t\tReactant: '+str(reactant.species))
-                        #if a species match has been found AND if such a match has been found
-                        founReaIDs = [tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][i]['id'] for i in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'] if not tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][i]['id']==None]
-                        self.logger.debug('\t\tfounReaIDs: '+str(founReaIDs))
-                        if reactant.species and reactant.species in species_match and not list(species_match[reactant.species].keys())==[] and not reactant.species in founReaIDs:
-                            best_spe = [k for k, v in sorted(species_match[reactant.species].items(), key=lambda item: item[1], reverse=True)][0]
-                            tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][reactant.species] = {'id': best_spe, 'score': species_match[reactant.species][best_spe], 'found': True}
-                            cannotBeSpecies.append(best_spe)
-                        elif not reactant.species in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants']:
-                            self.logger.warning('\t\tCould not find the following measured reactant in the matched species: '+str(reactant.species))
-                            tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][reactant.species] = {'id': None, 'score': 0.0, 'found': False}
-                    for product in source_reaction.getListOfProducts():
-                        self.logger.debug('\t\tProduct: '+str(product.species))
-                        foundProIDs = [tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products'][i]['id'] for i in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products'] if not tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products'][i]['id']==None]
-                        self.logger.debug('\t\tfoundProIDs: '+str(foundProIDs))
-                        if product.species and product.species in species_match and not list(species_match[product.species].keys())==[] and not product.species in foundProIDs:
-                            best_spe = [k for k, v in sorted(species_match[product.species].items(), key=lambda item: item[1], reverse=True)][0]
-                            tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][product.species] = {'id': best_spe, 'score': species_match[product.species][best_spe], 'found': True}
-                            cannotBeSpecies.append(best_spe)
-                        elif not product.species in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products']:
-                            self.logger.warning('\t\tCould not find the following measured product in the matched species: '+str(product.species))
-                            tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products'][product.species] = {'id': None, 'score': 0.0, 'found': False}
-                    self.logger.debug('\t\tcannotBeSpecies: '+str(cannotBeSpecies))
-                reactants_score = [tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][i]['score'] for i in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants']]
-                reactants_found = [tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants'][i]['found'] for i in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants']]
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['reactants_score'] = np.mean(reactants_score)
-                products_score = [tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products'][i]['score'] for i in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products']]
-                products_found = [tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products'][i]['found'] for i in tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products']]
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['products_score'] = np.mean(products_score)
-                ### calculate pathway species score
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['species_score'] = np.mean(reactants_score+products_score)
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['species_std'] = np.std(reactants_score+products_score)
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['species_reaction'] = target_reaction.getId()
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['found'] = all(reactants_found+products_found)
-                tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['score'] = tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['species_score']
-                target_source[target_reaction.getId()][source_reaction.getId()] = tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['score']
-                source_target[source_reaction.getId()][target_reaction.getId()] = tmp_reaction_match[source_reaction.getId()][target_reaction.getId()]['score']
+        score, target_ids, source_ids, details = self.reactionScoreMatrix(species_match, target_rpsbml, source_rpsbml, ec_weight)
+        found = details['found'].tocsc()
+        score_csc = score.tocsc()
         ### matrix compare #####
-        unique = self._findUniqueRowColumn(pd.DataFrame(source_target))
+        #only the rows and columns with at least one candidate are passed
+        nz_rows, nz_cols = score.nonzero()
+        unique = {}
+        if len(nz_rows)>0:
+            rows = np.unique(nz_rows)
+            cols = np.unique(nz_cols)
+            unique = self._findUniqueRowColumn(pd.DataFrame(score[rows][:, cols].toarray(),
+                                                            index=[target_ids[i] for i in rows],
+                                                            columns=[source_ids[i] for i in cols]))
         self.logger.debug('findUniqueRowColumn')
         self.logger.debug(unique)
+        target_index = {reac_id: i for i, reac_id in enumerate(target_ids)}
         reaction_match = {}
-        for meas in source_target:
+        for col, meas in enumerate(source_ids):
             reaction_match[meas] = {'id': None, 'score': 0.0, 'found': False}
             if meas in unique:
                 if len(unique[meas])>1:
                     self.logger.debug('Multiple values may match, choosing the first arbitrarily: '+str(unique))
+                row = target_index[unique[meas][0]]
                 reaction_match[meas]['id'] = unique[meas]
-                reaction_match[meas]['score'] = round(tmp_reaction_match[meas][unique[meas][0]]['score'], 5)
-                reaction_match[meas]['found'] = tmp_reaction_match[meas][unique[meas][0]]['found']
-        #### compile a reaction score based on the ec and species scores
-        self.logger.debug(tmp_reaction_match)
+                reaction_match[meas]['score'] = round(score_csc[row, col], 5)
+                reaction_match[meas]['found'] = bool(found[row, col])
         self.logger.debug(reaction_match)
         self.logger.debug('-------------------------------')
         return reaction_match
 
 
-
     #TODO: change this with a flag so that all the reactants and products are the same
     def containedReaction(self, species_source_target, source_reaction, target_reaction):
         """Compare individual reactions and see if the source reaction is contained within the target one
@@ -661,6 +750,9 @@ class rpMerge:
         :rtype: tuple
         """
         #target_rpsbml.model = target_document.getModel()
+        #not all the elements added below notify the changes (unit definitions, compartments, parameters, gene
+        #products, objectives), so the target is considered changed by the merge (see rpSBML.isDirty)
+        target_rpsbml.markDirty()
         #Find the ID's of the similar target_rpsbml.model species
         ################ MODEL FBC ########################
         if not target_rpsbml.model.isPackageEnabled('fbc'):
@@ -837,6 +929,7 @@ class rpMerge:
                 self._checklibSBML(target_member, 'Retraiving the target species: '+str(list_species[0]))
                 self._checklibSBML(source_member, 'Retreiving the source species: '+str(source_species))
                 self._checklibSBML(target_member.setAnnotation(source_member.getAnnotation()), 'Replacing the annotations')
+                target_rpsbml.notifyChange('annotation_updated', target_member.getId())
             #if no match then add it to the target model
             else:
                 self.logger.debug('Creating source species '+str(source_species)+' in target rpsbml')
@@ -877,6 +970,7 @@ class rpMerge:
                         'setting target constant')
                     self._checklibSBML(targetModel_species.setAnnotation(source_species.getAnnotation()),
                         'setting target annotation')
+                    target_rpsbml.notifyChange('species_created', target_species_id)
         ################ REACTIONS ###################
         #TODO; consider the case where two reactions have the same ID's but are not the same reactions
         #TODO: if overlapping id's need to replace the id with modified, as for the species
@@ -972,6 +1066,7 @@ class rpMerge:
                             'set "constant" on product '+str(source_product.getConstant()))
                     self._checklibSBML(target_product.setStoichiometry(source_product.getStoichiometry()),
                             'set stoichiometry ('+str(source_product.getStoichiometry)+')')
+                target_rpsbml.notifyChange('reaction_created', target_reaction.getId())
         #### GROUPS #####
         #TODO loop through the groups to add them
         if not target_rpsbml.model.isPackageEnabled('groups'):
@@ -1014,6 +1109,9 @@ class rpMerge:
             if not source_group.id in target_groups_ids:
                 self._checklibSBML(target_groups.addGroup(source_group),
                     'copy the source groups to the target groups')
+                target_rpsbml.notifyChange('group_created', source_group.id)
+                for member in source_group.getListOfMembers():
+                    target_rpsbml.notifyChange('group_member_added', member.getIdRef(), source_group.id)
             #if the group already exists in the target then need to add new members
             else:
                 target_group = target_groups.getGroup(source_group.id)
@@ -1023,6 +1121,7 @@ class rpMerge:
                         new_member = target_group.createMember()
                         self._checklibSBML(new_member, 'Creating a new groups member')
                         self._checklibSBML(new_member.setIdRef(member.getIdRef()), 'Setting name to the groups member')
+                        target_rpsbml.notifyChange('group_member_added', member.getIdRef(), source_group.id)
         """
         for group in source_groups.getListOfGroups():
             #for all the species that need to be converted, replace the ones that are
@@ -0,0 +1,233 @@
+"""rpPathway
+.. moduleauthor:: Melchior du Lac
+"""
+
+
+import sys
+
+
+## @package rpPathway
+# Compact representation of a heterologous pathway that is detached from libSBML
+#
+# rpSBML.genPathway returns the species, reactions, gene products, groups and annotations of a pathway as the objects
+# of this module and rpSBML.addPathway writes them back to a model. The objects use __slots__ and interned id strings
+# so that batch tools can hold a large number of pathways in memory without keeping the libSBML documents alive. The
+# fields are the same as the entries of the interchange representation (see rpSBML.genInterchange).
+
+
+class _rpFields:
+    """Base class of the pathway objects, with the conversion from and to the interchange entries
+    """
+    __slots__ = ()
+    #fields that are ids and are interned
+    _ids = ()
+
+    def __init__(self, **fields):
+        """Constructor of the pathway objects
+
+        :param fields: The values of the fields, the missing fields are None
+        """
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+        for name in self._ids:
+            if getattr(self, name) is not None:
+                setattr(self, name, sys.intern(getattr(self, name)))
+
+    def __repr__(self):
+        return self.__class__.__name__+'('+str(self.id)+')'
+
+    def __eq__(self, other):
+        return type(self)==type(other) and self.toFields()==other.toFields()
+
+    @classmethod
+    def fromFields(cls, fields):
+        """Return the object of an interchange entry
+
+        :param fields: The interchange entry
+
+        :type fields: dict
+
+        :return: The object
+        :rtype: _rpFields
+        """
+        return cls(**{i: fields[i] for i in cls.__slots__ if i in fields})
+
+    def toFields(self):
+        """Return the interchange entry of the object
+
+        The fields that are None are not returned
+
+        :return: The interchange entry
+        :rtype: dict
+        """
+        return {i: getattr(self, i) for i in self.__slots__ if getattr(self, i) is not None}
+
+
+class rpSpecies(_rpFields):
+    """Species of a pathway
+    """
+    __slots__ = ('id',
+                 'name',
+                 'compartment',
+                 'meta_id',
+                 'sbo',
+                 'initial_concentration',
+                 'has_only_substance_units',
+                 'boundary_condition',
+                 'constant',
+                 'charge',
+                 'formula',
+                 'miriam',
+                 'brsynth')
+    _ids = ('id', 'compartment')
+
+
+class rpReaction(_rpFields):
+    """Reaction of a pathway
+
+    Contrary to the interchange entries, the bounds are the values of the flux bounds (in units) and the reactants
+    and products are tuples of tuples of the species id and the stoichiometry
+    """
+    __slots__ = ('id',
+                 'name',
+                 'meta_id',
+                 'sbo',
+                 'reversible',
+                 'fast',
+                 'lower_bound',
+                 'upper_bound',
+                 'units',
+                 'reactants',
+                 'products',
+                 'gene_product_association',
+                 'miriam',
+                 'brsynth')
+    _ids = ('id',)
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        for name in ['reactants', 'products']:
+            if getattr(self, name) is not None:
+                setattr(self, name, tuple((sys.intern(i), float(y)) for i, y in getattr(self, name)))
+
+    def toFields(self):
+        fields = super().toFields()
+        for name in ['reactants', 'products']:
+            if name in fields:
+                fields[name] = [list(i) for i in fields[name]]
+        return fields
+
+
+class rpGeneProduct(_rpFields):
+    """Gene product of a pathway
+    """
+    __slots__ = ('id',
+                 'name',
+                 'label',
+                 'associated_species',
+                 'meta_id',
+                 'sbo',
+                 'miriam',
+                 'brsynth')
+    _ids = ('id', 'associated_species')
+
+
+class rpPathway(_rpFields):
+    """Heterologous pathway detached from libSBML
+
+    The species and reactions are dictionnaries of rpSpecies and rpReaction (in the order of the model and of the
+    members of the pathway group respectively), gene_products is the dictionnary of the rpGeneProduct of the model that
+    are referenced by the reactions or associated to the reactions or species of the pathway, and groups the members
+    of the other groups of the model (ex: central_species) that are species or reactions of the pathway
+    """
+    __slots__ = ('id',
+                 'name',
+                 'meta_id',
+                 'sbo',
+                 'kind',
+                 'model_id',
+                 'model_name',
+                 'miriam',
+                 'brsynth',
+                 'species',
+                 'reactions',
+                 'gene_products',
+                 'groups')
+    _ids = ('id',)
+
+    def __init__(self, **fields):
+        super().__init__(**fields)
+        if self.species is None:
+            self.species = {}
+        if self.reactions is None:
+            self.reactions = {}
+        if self.gene_products is None:
+            self.gene_products = {}
+        if self.groups is None:
+            self.groups = {}
+        self.groups = {sys.intern(i): tuple(sys.intern(y) for y in self.groups[i]) for i in self.groups}
+
+    @classmethod
+    def fromFields(cls, fields):
+        pathway = super().fromFields({i: fields[i] for i in fields if not i in ['species', 'reactions', 'gene_products']})
+        for spe in fields.get('species', []):
+            pathway.addSpecies(rpSpecies.fromFields(spe))
+        for reac in fields.get('reactions', []):
+            pathway.addReaction(rpReaction.fromFields(reac))
+        for gene_product in fields.get('gene_products', []):
+            pathway.addGeneProduct(rpGeneProduct.fromFields(gene_product))
+        return pathway
+
+    def toFields(self):
+        fields = super().toFields()
+        fields['species'] = [i.toFields() for i in self.species.values()]
+        fields['reactions'] = [i.toFields() for i in self.reactions.values()]
+        fields['gene_products'] = [i.toFields() for i in self.gene_products.values()]
+        fields['groups'] = {i: list(self.groups[i]) for i in self.groups}
+        return fields
+
+    def addSpecies(self, species):
+        """Add a species to the pathway
+
+        :param species: The species
+
+        :type species: rpSpecies
+
+        :return: None
+        :rtype: None
+        """
+        self.species[species.id] = species
+
+    def addReaction(self, reaction):
+        """Add a reaction to the pathway
+
+        :param reaction: The reaction
+
+        :type reaction: rpReaction
+
+        :return: None
+        :rtype: None
+        """
+        self.reactions[reaction.id] = reaction
+
+    def addGeneProduct(self, gene_product):
+        """Add a gene product to the pathway
+
+        :param gene_product: The gene product
+
+        :type gene_product: rpGeneProduct
+
+        :return: None
+        :rtype: None
+        """
+        self.gene_products[gene_product.id] = gene_product
+
+    def readRPspecies(self):
+        """Return the species stoichiometry of the reactions of the pathway
+
+        Same as rpSBML.readRPspecies
+
+        :return: Dictionary of the pathway species and reactions
+        :rtype: dict
+        """
+        return {i.id: {'reactants': dict(i.reactants), 'products': dict(i.products)} for i in self.reactions.values()}
@@ -6,8 +6,17 @@
 import libsbml
 from hashlib import md5
 import os
+import shutil
 import logging
 import copy
+import csv
+import numpy as np
+from scipy import sparse
+import re
+from xml.sax.saxutils import escape, unescape
+from xml.etree import ElementTree
+import rpPathway
+import rpFBA
 
 
 """
@@ -34,18 +43,34 @@ TODO
 class rpSBML:
     """This class uses the libSBML object and handles it by adding BRSynth annotation
     """
-    def __init__(self, modelName, document=None, path=None):
+    #the MIRIAM headers are shared by all the instances and must not be modified
+    miriam_header = {'compartment': {'mnx': 'metanetx.compartment/', 'bigg': 'bigg.compartment/', 'seed': 'seed/', 'name': 'name/'}, 'reaction': {'mnx': 'metanetx.reaction/', 'rhea': 'rhea/', 'reactome': 'reactome/', 'bigg': 'bigg.reaction/', 'sabiork': 'sabiork.reaction/', 'ec': 'ec-code/', 'biocyc': 'biocyc/', 'lipidmaps': 'lipidmaps/', 'uniprot': 'uniprot/'}, 'species': {'inchikey': 'inchikey/', 'pubchem': 'pubchem.compound/','mnx': 'metanetx.chemical/', 'chebi': 'chebi/CHEBI:', 'bigg': 'bigg.metabolite/', 'hmdb': 'hmdb/', 'kegg_c': 'kegg.compound/', 'kegg_d': 'kegg.drug/', 'biocyc': 'biocyc/META:', 'seed': 'seed.compound/', 'metacyc': 'metacyc.compound/', 'sabiork': 'sabiork.compound/', 'reactome': 'reactome/R-ALL-'}}
+    header_miriam = {'compartment': {'metanetx.compartment': 'mnx', 'bigg.compartment': 'bigg', 'seed': 'seed', 'name': 'name'}, 'reaction': {'metanetx.reaction': 'mnx', 'rhea': 'rhea', 'reactome': 'reactome', 'bigg.reaction': 'bigg', 'sabiork.reaction': 'sabiork', 'ec-code': 'ec', 'biocyc': 'biocyc', 'lipidmaps': 'lipidmaps', 'uniprot': 'uniprot'}, 'species': {'inchikey': 'inchikey', 'pubchem.compound': 'pubchem', 'metanetx.chemical': 'mnx', 'chebi': 'chebi', 'bigg.metabolite': 'bigg', 'hmdb': 'hmdb', 'kegg.compound': 'kegg_c', 'kegg.drug': 'kegg_d', 'biocyc': 'biocyc', 'seed.compound': 'seed', 'metacyc.compound': 'metacyc', 'sabiork.compound': 'sabiork', 'reactome': 'reactome'}}
+
+    #path of the SBML file that is read on the first access to the model or the document (lazy mode)
+    _lazy_path = None
+    #the model is not identical to a SBML file (see isDirty)
+    _dirty = True
+    #path of the SBML file that the model is identical to when it is not dirty
+    _source_path = None
+    #documents of genericModel by compartment and bounds, shared by all the instances and cloned (see genericModel)
+    _generic_models = {}
+
+    def __init__(self, modelName, document=None, path=None, lazy=False):
         """Constructor for the rpSBML class
 
         Note that the user can pass either a document libSBML object or a path to a SBML file. If a path is passed it overwrite the passed document object.
+        In lazy mode the file is only read on the first access to the model or the document, and readHeader returns the summary of the file without reading it with libSBML
 
         :param modelName: The Name of the model
         :param document: The libSBML document class (Default: None)
         :param path: The path of a SBML file (Default: None)
+        :param lazy: Postpone the reading of the SBML file (Default: False)
 
         :type modelName: str
         :type path: str
         :type document: libsbml.SBMLDocument
+        :type lazy: bool
         """
         self.logger = logging.getLogger(__name__)
         #WARNING: change this to reflect the different debugging levels
@@ -59,11 +84,71 @@ class rpSBML:
             self.model = self.document.getModel()
         if not path==None:
             self.path = path
-            self.readSBML(path)
+            if lazy:
+                if not os.path.isfile(path):
+                    self.logger.error('Invalid input file')
+                    raise FileNotFoundError
+                self._lazy_path = path
+                self._source_path = path
+                self._dirty = False
+            else:
+                self.readSBML(path)
         else:
             self.path = None
-        self.miriam_header = {'compartment': {'mnx': 'metanetx.compartment/', 'bigg': 'bigg.compartment/', 'seed': 'seed/', 'name': 'name/'}, 'reaction': {'mnx': 'metanetx.reaction/', 'rhea': 'rhea/', 'reactome': 'reactome/', 'bigg': 'bigg.reaction/', 'sabiork': 'sabiork.reaction/', 'ec': 'ec-code/', 'biocyc': 'biocyc/', 'lipidmaps': 'lipidmaps/', 'uniprot': 'uniprot/'}, 'species': {'inchikey': 'inchikey/', 'pubchem': 'pubchem.compound/','mnx': 'metanetx.chemical/', 'chebi': 'chebi/CHEBI:', 'bigg': 'bigg.metabolite/', 'hmdb': 'hmdb/', 'kegg_c': 'kegg.compound/', 'kegg_d': 'kegg.drug/', 'biocyc': 'biocyc/META:', 'seed': 'seed.compound/', 'metacyc': 'metacyc.compound/', 'sabiork': 'sabiork.compound/', 'reactome': 'reactome/R-ALL-'}}
-        self.header_miriam = {'compartment': {'metanetx.compartment': 'mnx', 'bigg.compartment': 'bigg', 'seed': 'seed', 'name': 'name'}, 'reaction': {'metanetx.reaction': 'mnx', 'rhea': 'rhea', 'reactome': 'reactome', 'bigg.reaction': 'bigg', 'sabiork.reaction': 'sabiork', 'ec-code': 'ec', 'biocyc': 'biocyc', 'lipidmaps': 'lipidmaps', 'uniprot': 'uniprot'}, 'species': {'inchikey': 'inchikey', 'pubchem.compound': 'pubchem', 'metanetx.chemical': 'mnx', 'chebi': 'chebi', 'bigg.metabolite': 'bigg', 'hmdb': 'hmdb', 'kegg.compound': 'kegg_c', 'kegg.drug': 'kegg_d', 'biocyc': 'biocyc', 'seed.compound': 'seed', 'metacyc.compound': 'metacyc', 'sabiork.compound': 'sabiork', 'reactome': 'reactome'}}
+        self._listeners = []
+
+
+    @property
+    def document(self):
+        """The libSBML document, read from the file on the first access in lazy mode
+        """
+        if self._lazy_path:
+            self._readLazy()
+        return self._document
+
+
+    @document.setter
+    def document(self, document):
+        self._lazy_path = None
+        self._document = document
+
+
+    @property
+    def model(self):
+        """The libSBML model, read from the file on the first access in lazy mode
+        """
+        if self._lazy_path:
+            self._readLazy()
+        return self._model
+
+
+    @model.setter
+    def model(self, model):
+        self._lazy_path = None
+        self._model = model
+
+
+    def _readLazy(self):
+        """Private function that reads the SBML file of the lazy mode
+
+        :raises FileNotFoundError: If the file cannot be read
+
+        :rtype: None
+        :return: None
+        """
+        path = self._lazy_path
+        self._lazy_path = None
+        self.logger.debug('Reading the SBML file of the lazy mode: '+str(path))
+        self.readSBML(path)
+
+
+    def isLoaded(self):
+        """Return if the SBML has been read (always True when not in lazy mode)
+
+        :rtype: bool
+        :return: If the SBML has been read
+        """
+        return self._lazy_path==None
 
 
     #######################################################################
@@ -174,6 +259,88 @@ class rpSBML:
         return toadd
 
 
+    ######################################################################
+    ####################### Change events ################################
+    ######################################################################
+
+
+    def addListener(self, listener):
+        """Register a function that is called every time the model is changed through the rpSBML functions
+
+        The listener is called as listener(event, element_id, group_id) where event is one of: species_created,
+        species_removed, reaction_created, reaction_updated, group_created, group_member_added, group_member_removed or
+        annotation_updated. The group_id is only passed for the group_member_added and group_member_removed events
+
+        :param listener: The function to call
+
+        :type listener: function
+
+        :rtype: None
+        :return: None
+        """
+        if not listener in self._listeners:
+            self._listeners.append(listener)
+
+
+    def removeListener(self, listener):
+        """Unregister a function registered with addListener()
+
+        :param listener: The function to remove
+
+        :type listener: function
+
+        :rtype: None
+        :return: None
+        """
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+
+    def notifyChange(self, event, element_id, group_id=None):
+        """Notify the listeners that the model has been changed
+
+        Called by the rpSBML functions that change the model. Functions that change the libSBML model directly
+        (ex: rpMerge.mergeModels()) should call it as well
+
+        :param event: The type of change
+        :param element_id: The id of the changed element
+        :param group_id: The id of the group for the group_member_added event (Default: None)
+
+        :type event: str
+        :type element_id: str
+        :type group_id: str
+
+        :rtype: None
+        :return: None
+        """
+        self._dirty = True
+        for listener in list(self._listeners):
+            listener(event, element_id, group_id)
+
+
+    def markDirty(self):
+        """Record that the model has been changed, so that writeSBML does not skip it
+
+        The rpSBML functions that change the model do it themselves. Functions that change the libSBML model directly
+        should call it (or notifyChange)
+
+        :rtype: None
+        :return: None
+        """
+        self._dirty = True
+
+
+    def isDirty(self):
+        """Return if the model has been changed since it was read or written
+
+        New models (created or from a libSBML document) are always dirty
+
+        :rtype: bool
+        :return: If the model has been changed
+        """
+        return self._dirty
+
+
     ######################################################################
     ####################### Annotations ##################################
     ######################################################################
@@ -385,6 +552,7 @@ class rpSBML:
             #toWrite_annot = annot_obj.getChild('RDF').getChild('BRSynth').getChild('brsynth').getChild(annot_header)
             #self._checklibSBML(brsynth_annot.addChild(toWrite_annot), 'Adding annotation to the brsynth annotation')
                 return False
+        self.notifyChange('annotation_updated', sbase_obj.getId())
         '''
         if brsynth_annot.getChild(annot_header).toXMLString()=='':
             toWrite_annot = annot_obj.getChild('RDF').getChild('BRSynth').getChild('brsynth').getChild(annot_header)
@@ -415,6 +583,62 @@ class rpSBML:
         return True
 
 
+    def addUpdateBRSynthMany(self, annot_header, ids, values, units=None):
+        """Append or update the same entry of the BRSynth annotation of many reactions or species in a single pass
+
+        Same as calling addUpdateBRSynth (with isAlone=False) for each element, but the entries are created directly as
+        XML nodes instead of being parsed from strings, and the elements are found with a single index of the model.
+        The elements without annotation are given a default BRSynth annotation, and the nan values are not written
+
+        :param annot_header: The annotation header that defines the type of entry (ex: dfG_prime_m, fba_obj_biomass)
+        :param ids: The ids of the reactions or species
+        :param values: The values aligned with the ids
+        :param units: The units of the values (Default: None)
+
+        :type annot_header: str
+        :type ids: list
+        :type values: numpy.ndarray
+        :type units: str
+
+        :rtype: int
+        :return: The number of elements updated
+        """
+        elements = {}
+        for sbase in self.model.getListOfSpecies():
+            elements[sbase.getId()] = sbase
+        for sbase in self.model.getListOfReactions():
+            elements[sbase.getId()] = sbase
+        triple = libsbml.XMLTriple(str(annot_header), 'http://brsynth.eu', 'brsynth')
+        count = 0
+        for element_id, value in zip(ids, np.asarray(values).tolist()):
+            if not element_id in elements:
+                self.logger.warning('Cannot find the reaction or species: '+str(element_id))
+                continue
+            if isinstance(value, float) and np.isnan(value):
+                continue
+            sbase = elements[element_id]
+            obj_annot = sbase.getAnnotation()
+            if not obj_annot:
+                self._checklibSBML(sbase.setAnnotation(self._defaultBRSynthAnnot(sbase.getMetaId())), 'creating annotation')
+                obj_annot = sbase.getAnnotation()
+            brsynth_annot = obj_annot.getChild('RDF').getChild('BRSynth').getChild('brsynth')
+            if not brsynth_annot.getName()=='brsynth':
+                self.logger.error('Cannot find the BRSynth annotation of '+str(element_id))
+                continue
+            for i in range(brsynth_annot.getNumChildren()):
+                if brsynth_annot.getChild(i).getName()==annot_header:
+                    brsynth_annot.removeChild(i)
+                    break
+            attributes = libsbml.XMLAttributes()
+            if units:
+                attributes.add('units', str(units))
+            attributes.add('value', str(value))
+            self._checklibSBML(brsynth_annot.addChild(libsbml.XMLNode(triple, attributes)), 'adding '+str(annot_header)+' to the brsynth annotation')
+            self.notifyChange('annotation_updated', element_id)
+            count += 1
+        return count
+
+
     def addUpdateMIRIAM(self, sbase_obj, type_param, xref, meta_id=None):
         """Append or update an entry to the MIRIAM annotation of the passed libsbml.SBase object.
         
@@ -531,6 +755,7 @@ class rpSBML:
             else:
                 self._checklibSBML(ori_miriam_annot.getChild('RDF').getChild('Description').getChild('is').removeChild(0), 'Removing annotation "is"')
                 self._checklibSBML(ori_miriam_annot.getChild('RDF').getChild('Description').getChild('is').addChild(miriam_annot), 'Adding annotation to the brsynth annotation')
+        self.notifyChange('annotation_updated', sbase_obj.getId())
         return True
 
 
@@ -593,6 +818,45 @@ class rpSBML:
             raise FileNotFoundError
         document = libsbml.readSBMLFromFile(inFile)
         self._checklibSBML(document, 'reading input file')
+        self._setDocument(document)
+        self._source_path = inFile
+
+
+    def readSBMLString(self, sbml_string):
+        """Open an SBML string to the object
+
+        Used when the SBML has not been written to a file, for example when it is read from an archive
+
+        :param sbml_string: The SBML content
+        
+        :type sbml_string: Union[str, bytes]
+
+        :raises FileNotFoundError: If the SBML cannot be read
+        :raises AttributeError: If the libSBML command encounters an error or the input value is None
+
+        :rtype: None
+        :return: None
+        """
+        if isinstance(sbml_string, bytes):
+            sbml_string = sbml_string.decode('utf-8')
+        document = libsbml.readSBMLFromString(sbml_string)
+        self._checklibSBML(document, 'reading input string')
+        self._setDocument(document)
+
+
+    def _setDocument(self, document):
+        """Private function that checks a libSBML document that has been read and sets it to the object
+
+        :param document: The libSBML document
+        
+        :type document: libsbml.SBMLDocument
+
+        :raises FileNotFoundError: If the document contains fatal errors or no model
+        :raises AttributeError: If the libSBML command encounters an error or the input value is None
+
+        :rtype: None
+        :return: None
+        """
         errors = document.getNumErrors()
         #display the errors in the log accordning to the severity
         for err in [document.getError(i) for i in range(document.getNumErrors())]:
@@ -608,8 +872,11 @@ class rpSBML:
             raise FileNotFoundError
         self.document = document
         self.model = model
+        self._dirty = False
+        self._source_path = None
         #enabling the extra packages if they do not exists when reading a model
         if not self.model.isPackageEnabled('groups'):
+            self._dirty = True
             self._checklibSBML(self.model.enablePackage(
                 'http://www.sbml.org/sbml/level3/version1/groups/version1',
                 'groups',
@@ -617,6 +884,7 @@ class rpSBML:
                     'Enabling the GROUPS package')
             self._checklibSBML(self.document.setPackageRequired('groups', False), 'enabling groups package')
         if not self.model.isPackageEnabled('fbc'):
+            self._dirty = True
             self._checklibSBML(self.model.enablePackage(
                 'http://www.sbml.org/sbml/level3/version1/fbc/version2',
                 'fbc',
@@ -625,12 +893,113 @@ class rpSBML:
             self._checklibSBML(self.document.setPackageRequired('fbc', False), 'enabling FBC package')
 
 
-    def writeSBML(self, path):
+    def readHeader(self, pathway_id='rp_pathway'):
+        """Return the summary of the model: its id and name, the groups and the BRSynth annotation of a pathway
+
+        In lazy mode, if the SBML has not been read yet, the summary is scanned from the file without reading it with
+        libSBML (the file is not validated)
+
+        :param pathway_id: The pathway ID of the returned BRSynth annotation (Default: rp_pathway)
+
+        :type pathway_id: str
+
+        :rtype: dict
+        :return: Dictionnary with the keys model_id, model_name, groups (dictionnary of the group ids and their number of members) and brsynth (as in genInterchange)
+        """
+        if self._lazy_path:
+            with open(self._lazy_path, 'rb') as in_file:
+                return self._scanHeader(in_file.read(), pathway_id)
+        toRet = {'model_id': self.model.getId(), 'model_name': self.model.getName(), 'groups': {}, 'brsynth': {}}
+        groups = self.model.getPlugin('groups')
+        for group in groups.getListOfGroups():
+            toRet['groups'][group.getId()] = group.getNumMembers()
+            if group.getId()==pathway_id:
+                toRet['brsynth'] = self._readBRSynthFields(group.getAnnotation())
+        return toRet
+
+
+    def _scanHeader(self, content, pathway_id='rp_pathway'):
+        """Private function that returns the summary of the model from the content of a SBML file without libSBML
+
+        See readHeader for the returned fields
+
+        :param content: The content of the SBML file
+        :param pathway_id: The pathway ID of the returned BRSynth annotation (Default: rp_pathway)
+
+        :type content: bytes
+        :type pathway_id: str
+
+        :rtype: dict
+        :return: The summary of the model
+        """
+        attributes = lambda tag: {i[1].decode('utf-8'): unescape(i[2].decode('utf-8'), {'&quot;': '"'}) for i in re.findall(rb'(\w+:)?(\w+)="([^"]*)"', tag)}
+        toRet = {'model_id': '', 'model_name': '', 'groups': {}, 'brsynth': {}}
+        model = re.search(rb'<(\w+:)?model\b([^>]*)>', content)
+        if model:
+            model_attr = attributes(model.group(2))
+            toRet['model_id'] = model_attr.get('id', '')
+            toRet['model_name'] = model_attr.get('name', '')
+        for group in re.finditer(rb'<(\w+:)?group\b([^>]*?)(/?)>', content):
+            group_id = attributes(group.group(2)).get('id', '')
+            if group.group(3):
+                toRet['groups'][group_id] = 0
+                continue
+            group_content = content[group.end():content.find(b'</'+(group.group(1) or b'')+b'group>', group.end())]
+            toRet['groups'][group_id] = len(re.findall(rb'<(\w+:)?member\b', group_content))
+            if group_id==pathway_id:
+                annotation = re.search(rb'<annotation\b.*?</annotation>', group_content, re.DOTALL)
+                if annotation:
+                    try:
+                        brsynth = ElementTree.fromstring(annotation.group(0)).find('.//{http://brsynth.eu}brsynth')
+                    except ElementTree.ParseError:
+                        self.logger.warning('Cannot parse the annotation of the group '+str(group_id))
+                        brsynth = None
+                    if not brsynth==None:
+                        toRet['brsynth'] = self._readBRSynthElement(brsynth)
+        return toRet
+
+
+    def _readBRSynthElement(self, brsynth):
+        """Private function that returns the BRSynth annotation of an ElementTree element as typed fields
+
+        Same as _readBRSynthFields for the annotations that are not read with libSBML
+
+        :param brsynth: The brsynth:brsynth element
+
+        :type brsynth: xml.etree.ElementTree.Element
+
+        :rtype: dict
+        :return: Dictionnary of the BRSynth entries
+        """
+        toRet = {}
+        for ann in brsynth:
+            name = ann.tag.split('}')[-1]
+            if 'value' in ann.attrib:
+                toRet[name] = {'value': self._typedValue(ann.attrib['value'])}
+                if 'units' in ann.attrib:
+                    toRet[name]['units'] = ann.attrib['units']
+            elif len(ann)==0:
+                toRet[name] = ann.text or ''
+            else:
+                toRet[name] = {i.tag.split('}')[-1]: self._typedValue(i.attrib.get('value', '')) for i in ann}
+        return toRet
+
+
+    def writeSBML(self, path, skip_clean=False, link_clean=False):
         """Export the metabolic network to a SBML file
 
+        The file is written to a temporary file that is renamed, so that the output file is never partially written.
+        If the model has not been changed since it was read or written (see isDirty), the file can be left as it is
+        (skip_clean) or replaced by a hard link to the file the model was read from (link_clean, a copy if the
+        files are on different devices)
+
         :param path: Path to the output SBML file
+        :param skip_clean: Do not write the file if it is the file the model was read from (or last written to) and the model has not been changed (Default: False)
+        :param link_clean: Link the source file if the model has not been changed (Default: False)
         
         :type path: str
+        :type skip_clean: bool
+        :type link_clean: bool
 
         :raises FileNotFoundError: If the file cannot be found
         :raises AttributeError: If the libSBML command encounters an error or the input value is None
@@ -657,7 +1026,728 @@ class rpSBML:
         ########## check and create folder #####
         if not os.path.exists(p):
             os.makedirs(p)
-        libsbml.writeSBMLToFile(self.document, p+'/'+str(self.modelName)+'.sbml')
+        out_path = p+'/'+str(self.modelName)+'.sbml'
+        ########## unchanged model ############
+        if not self._dirty:
+            if skip_clean and self._source_path and os.path.exists(out_path) and os.path.samefile(out_path, self._source_path):
+                self.logger.debug('The model has not been changed, skipping the writing of '+str(out_path))
+                return True
+            if link_clean and self._source_path:
+                if os.path.exists(out_path) and os.path.samefile(out_path, self._source_path):
+                    return True
+                tmp_path = out_path+'.'+str(os.getpid())+'.tmp'
+                try:
+                    os.link(self._source_path, tmp_path)
+                except OSError:
+                    shutil.copyfile(self._source_path, tmp_path)
+                os.replace(tmp_path, out_path)
+                return True
+        ########## atomic write ###############
+        tmp_path = out_path+'.'+str(os.getpid())+'.tmp'
+        if not libsbml.writeSBMLToFile(self.document, tmp_path):
+            self.logger.error('Cannot write the SBML file: '+str(out_path))
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        os.replace(tmp_path, out_path)
+        self._dirty = False
+        self._source_path = out_path
+        return True
+
+
+    #####################################################################
+    ########################## INTERCHANGE ##############################
+    #####################################################################
+
+
+    def _readMIRIAMResources(self, annot):
+        """Private function that returns the MIRIAM cross references of an annotation without loss
+
+        Contrary to readMIRIAMAnnotation, the database namespaces and the identifiers are kept as they are written
+        so that the annotation can be written back identically
+
+        :param annot: The annotation object of libSBML
+
+        :type annot: libsbml.XMLNode
+
+        :rtype: dict
+        :return: Dictionnary of the namespace (ex: metanetx.chemical) and the list of identifiers
+        """
+        toRet = {}
+        try:
+            bag = annot.getChild('RDF').getChild('Description').getChild('is').getChild('Bag')
+        except AttributeError:
+            return toRet
+        for i in range(bag.getNumChildren()):
+            resource = bag.getChild(i).getAttrValue(0)
+            if resource=='':
+                continue
+            namespace, identifier = resource.rsplit('/', 1)
+            if namespace.startswith('http://identifiers.org/'):
+                namespace = namespace[len('http://identifiers.org/'):]
+            toRet.setdefault(namespace, []).append(identifier)
+        return toRet
+
+
+    def _readBRSynthFields(self, annot):
+        """Private function that returns the BRSynth annotation as typed fields
+
+        Entries with a value attribute are returned as a dictionnary with the value (int or float when possible) and the
+        units if they exist, lists (ex: selenzyme) as a dictionnary of the typed values and the other entries as strings
+
+        :param annot: The annotation object of libSBML
+
+        :type annot: libsbml.XMLNode
+
+        :rtype: dict
+        :return: Dictionnary of the BRSynth entries
+        """
+        toRet = {}
+        try:
+            bag = annot.getChild('RDF').getChild('BRSynth').getChild('brsynth')
+        except AttributeError:
+            return toRet
+        for i in range(bag.getNumChildren()):
+            ann = bag.getChild(i)
+            if not ann.isStart():
+                continue
+            if ann.hasAttr('value'):
+                toRet[ann.getName()] = {'value': self._typedValue(ann.getAttrValue('value'))}
+                if ann.hasAttr('units'):
+                    toRet[ann.getName()]['units'] = ann.getAttrValue('units')
+            elif ann.getNumChildren()==1 and ann.getChild(0).isText():
+                toRet[ann.getName()] = ann.getChild(0).getCharacters()
+            else:
+                toRet[ann.getName()] = {ann.getChild(y).getName(): self._typedValue(ann.getChild(y).getAttrValue('value'))
+                        for y in range(ann.getNumChildren()) if ann.getChild(y).isStart()}
+        return toRet
+
+
+    def _typedValue(self, value):
+        """Private function that converts a string annotation value to int or float when possible
+
+        The value is only converted if it is written back identically, is finite and fits in 64 bits (ex: 1.50, 1_000,
+        nan and 123456789012345678901 are kept as strings), so that the annotation is not changed by the round trip and
+        can be encoded in JSON and msgpack
+
+        :param value: The value
+
+        :type value: str
+
+        :rtype: Union[int, float, str]
+        :return: The typed value
+        """
+        for cast in [int, float]:
+            try:
+                typed = cast(value)
+            except ValueError:
+                continue
+            if str(typed)!=value:
+                return value
+            #orjson and msgpack do not encode the ints out of the 64 bits range
+            if isinstance(typed, int) and not -2**63<=typed<2**64:
+                return value
+            if isinstance(typed, float) and not np.isfinite(typed):
+                return value
+            return typed
+        return value
+
+
+    def _interchangeFloat(self, value):
+        """Private function that returns a float of the model for the interchange representation
+
+        JSON cannot encode the non-finite floats, that are returned as strings (inf, -inf or nan) and converted back
+        by float() when they are read
+
+        :param value: The value
+
+        :type value: float
+
+        :rtype: Union[float, str]
+        :return: The value, or its string if it is not finite
+        """
+        return value if np.isfinite(value) else str(value)
+
+
+    def _genAssociationFields(self, association):
+        """Private function that returns the interchange entry of a gene product association
+
+        :param association: The libSBML association (gene product reference, and, or)
+
+        :type association: libsbml.FbcAssociation
+
+        :rtype: Union[str, dict]
+        :return: The id of the gene product, or a dictionnary of the operator (and, or) and the list of its associations
+        """
+        if association.isGeneProductRef():
+            return association.getGeneProduct()
+        return {'and' if association.isFbcAnd() else 'or': [self._genAssociationFields(association.getAssociation(i)) for i in range(association.getNumAssociations())]}
+
+
+    def _associationGeneProducts(self, fields):
+        """Private function that returns the ids of the gene products of the interchange entry of an association
+
+        :param fields: The interchange entry of the association (see _genAssociationFields)
+
+        :type fields: Union[str, dict]
+
+        :rtype: list
+        :return: The gene product ids
+        """
+        if isinstance(fields, str):
+            return [fields]
+        return [y for i in list(fields.values())[0] for y in self._associationGeneProducts(i)]
+
+
+    def _createAssociationFields(self, parent, fields):
+        """Private function that creates a gene product association from its interchange entry
+
+        :param parent: The libSBML gene product association, and or or that contains the association
+        :param fields: The interchange entry of the association (see _genAssociationFields)
+
+        :type parent: libsbml.SBase
+        :type fields: Union[str, dict]
+
+        :rtype: None
+        :return: None
+        """
+        if isinstance(fields, str):
+            self._checklibSBML(parent.createGeneProductRef().setGeneProduct(fields), 'setting gene product reference')
+            return None
+        if 'and' in fields:
+            association = parent.createAnd()
+            children = fields['and']
+        else:
+            association = parent.createOr()
+            children = fields['or']
+        self._checklibSBML(association, 'creating gene product association')
+        for child in children:
+            self._createAssociationFields(association, child)
+
+
+    def _interchangeAnnotation(self, meta_id, miriam=None, brsynth=None):
+        """Private function that returns the annotation string of the MIRIAM and BRSynth fields of the interchange format
+
+        :param meta_id: The meta ID of the annotated object
+        :param miriam: The MIRIAM cross references as returned by _readMIRIAMResources (Default: None)
+        :param brsynth: The BRSynth entries as returned by _readBRSynthFields (Default: None)
+
+        :type meta_id: str
+        :type miriam: dict
+        :type brsynth: dict
+
+        :rtype: str
+        :return: The annotation string
+        """
+        annotation = '<annotation><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns:bqbiol="http://biomodels.net/biology-qualifiers/">'
+        if miriam is not None:
+            annotation += '<rdf:Description rdf:about="#'+escape(str(meta_id or ''))+'"><bqbiol:is><rdf:Bag>'
+            for namespace in miriam:
+                if not '://' in namespace:
+                    namespace_url = 'http://identifiers.org/'+namespace
+                else:
+                    namespace_url = namespace
+                for identifier in miriam[namespace]:
+                    annotation += '<rdf:li rdf:resource="'+escape(namespace_url+'/'+str(identifier), {'"': '&quot;'})+'"/>'
+            annotation += '</rdf:Bag></bqbiol:is></rdf:Description>'
+        if brsynth is not None:
+            annotation += '<rdf:BRSynth rdf:about="#'+escape(str(meta_id or ''))+'"><brsynth:brsynth xmlns:brsynth="http://brsynth.eu">'
+            for name in brsynth:
+                value = brsynth[name]
+                #dictionnaries that only have value and units are single entries, the others are lists
+                if isinstance(value, dict) and 'value' in value and set(value)<=set(['value', 'units']):
+                    annotation += '<brsynth:'+name
+                    if 'units' in value:
+                        annotation += ' units="'+escape(str(value['units']), {'"': '&quot;'})+'"'
+                    annotation += ' value="'+escape(str(value['value']), {'"': '&quot;'})+'"/>'
+                elif isinstance(value, dict):
+                    annotation += '<brsynth:'+name+'>'
+                    for y in value:
+                        annotation += '<brsynth:'+y+' value="'+escape(str(value[y]), {'"': '&quot;'})+'"/>'
+                    annotation += '</brsynth:'+name+'>'
+                else:
+                    annotation += '<brsynth:'+name+'>'+escape(str(value))+'</brsynth:'+name+'>'
+            annotation += '</brsynth:brsynth></rdf:BRSynth>'
+        return annotation+'</rdf:RDF></annotation>'
+
+
+    def _genAnnotationFields(self, sbase, fields):
+        """Private function that adds the meta ID, SBO term and annotations of a libSBML object to its interchange entry
+
+        :param sbase: The libSBML object
+        :param fields: The interchange entry of the object
+
+        :type sbase: libsbml.SBase
+        :type fields: dict
+
+        :rtype: dict
+        :return: The interchange entry
+        """
+        if sbase.isSetMetaId():
+            fields['meta_id'] = sbase.getMetaId()
+        if sbase.isSetSBOTerm():
+            fields['sbo'] = sbase.getSBOTerm()
+        annot = sbase.getAnnotation()
+        if annot:
+            rdf = annot.getChild('RDF')
+            if rdf.hasChild('Description'):
+                fields['miriam'] = self._readMIRIAMResources(annot)
+            if rdf.hasChild('BRSynth'):
+                fields['brsynth'] = self._readBRSynthFields(annot)
+        return fields
+
+
+    def _setAnnotationFields(self, sbase, fields):
+        """Private function that sets the meta ID, SBO term and annotations of an interchange entry to a libSBML object
+
+        :param sbase: The libSBML object
+        :param fields: The interchange entry of the object
+
+        :type sbase: libsbml.SBase
+        :type fields: dict
+
+        :rtype: None
+        :return: None
+        """
+        if 'meta_id' in fields:
+            self._checklibSBML(sbase.setMetaId(fields['meta_id']), 'setting meta_id '+str(fields['meta_id']))
+        if 'sbo' in fields:
+            self._checklibSBML(sbase.setSBOTerm(fields['sbo']), 'setting SBO term of '+str(fields['id']))
+        if 'miriam' in fields or 'brsynth' in fields:
+            self._checklibSBML(sbase.setAnnotation(self._interchangeAnnotation(fields.get('meta_id'),
+                                                                               fields.get('miriam'),
+                                                                               fields.get('brsynth'))),
+                               'setting annotation of '+str(fields['id']))
+
+
+    def _genSpeciesFields(self, spe):
+        """Private function that returns the interchange entry of a species
+
+        :param spe: The libSBML species
+
+        :type spe: libsbml.Species
+
+        :rtype: dict
+        :return: The interchange entry of the species
+        """
+        fields = {'id': spe.getId(),
+                  'name': spe.getName(),
+                  'compartment': spe.getCompartment(),
+                  'initial_concentration': self._interchangeFloat(spe.getInitialConcentration()) if spe.isSetInitialConcentration() else None,
+                  'has_only_substance_units': spe.getHasOnlySubstanceUnits(),
+                  'boundary_condition': spe.getBoundaryCondition(),
+                  'constant': spe.getConstant()}
+        spe_fbc = spe.getPlugin('fbc')
+        if spe_fbc and spe_fbc.isSetCharge():
+            fields['charge'] = spe_fbc.getCharge()
+        if spe_fbc and spe_fbc.isSetChemicalFormula():
+            fields['formula'] = spe_fbc.getChemicalFormula()
+        return self._genAnnotationFields(spe, fields)
+
+
+    def _genReactionFields(self, reac):
+        """Private function that returns the interchange entry of a reaction
+
+        :param reac: The libSBML reaction
+
+        :type reac: libsbml.Reaction
+
+        :rtype: dict
+        :return: The interchange entry of the reaction
+        """
+        reac_fbc = reac.getPlugin('fbc')
+        fields = {'id': reac.getId(),
+                  'name': reac.getName(),
+                  'reversible': reac.getReversible(),
+                  'fast': reac.getFast(),
+                  'lower_bound': reac_fbc.getLowerFluxBound() if reac_fbc else '',
+                  'upper_bound': reac_fbc.getUpperFluxBound() if reac_fbc else '',
+                  'reactants': [[i.getSpecies(), self._interchangeFloat(i.getStoichiometry())] for i in reac.getListOfReactants()],
+                  'products': [[i.getSpecies(), self._interchangeFloat(i.getStoichiometry())] for i in reac.getListOfProducts()]}
+        if reac_fbc and reac_fbc.isSetGeneProductAssociation() and reac_fbc.getGeneProductAssociation().isSetAssociation():
+            fields['gene_product_association'] = self._genAssociationFields(reac_fbc.getGeneProductAssociation().getAssociation())
+        return self._genAnnotationFields(reac, fields)
+
+
+    def _createSpeciesFields(self, fields):
+        """Private function that creates a species from its interchange entry
+
+        :param fields: The interchange entry of the species
+
+        :type fields: dict
+
+        :rtype: libsbml.Species
+        :return: The created species
+        """
+        spe = self.model.createSpecies()
+        self._checklibSBML(spe.setId(fields['id']), 'set species id')
+        if fields['name']:
+            self._checklibSBML(spe.setName(fields['name']), 'setting name for the species '+str(fields['id']))
+        self._checklibSBML(spe.setCompartment(fields['compartment']), 'set species compartment')
+        self._checklibSBML(spe.setHasOnlySubstanceUnits(fields['has_only_substance_units']), 'set substance units')
+        self._checklibSBML(spe.setBoundaryCondition(fields['boundary_condition']), 'set boundary conditions')
+        self._checklibSBML(spe.setConstant(fields['constant']), 'set constant')
+        if fields['initial_concentration'] is not None:
+            self._checklibSBML(spe.setInitialConcentration(float(fields['initial_concentration'])), 'set an initial concentration')
+        if 'charge' in fields:
+            self._checklibSBML(spe.getPlugin('fbc').setCharge(fields['charge']), 'set species charge')
+        if 'formula' in fields:
+            self._checklibSBML(spe.getPlugin('fbc').setChemicalFormula(fields['formula']), 'set species formula')
+        self._setAnnotationFields(spe, fields)
+        return spe
+
+
+    def _createReactionFields(self, fields):
+        """Private function that creates a reaction from its interchange entry
+
+        The flux bound parameters must exist in the model
+
+        :param fields: The interchange entry of the reaction
+
+        :type fields: dict
+
+        :rtype: libsbml.Reaction
+        :return: The created reaction
+        """
+        reac = self.model.createReaction()
+        self._checklibSBML(reac.setId(fields['id']), 'set reaction id')
+        if fields['name']:
+            self._checklibSBML(reac.setName(fields['name']), 'set reaction name')
+        self._checklibSBML(reac.setReversible(fields['reversible']), 'set reaction reversibility flag')
+        self._checklibSBML(reac.setFast(fields['fast']), 'set reaction "fast" attribute')
+        reac_fbc = reac.getPlugin('fbc')
+        if fields['lower_bound']:
+            self._checklibSBML(reac_fbc.setLowerFluxBound(fields['lower_bound']), 'setting '+str(fields['id'])+' lower flux bound')
+        if fields['upper_bound']:
+            self._checklibSBML(reac_fbc.setUpperFluxBound(fields['upper_bound']), 'setting '+str(fields['id'])+' upper flux bound')
+        for species_id, stoichiometry in fields['reactants']:
+            spe = reac.createReactant()
+            self._checklibSBML(spe.setSpecies(species_id), 'assign reactant species')
+            self._checklibSBML(spe.setConstant(True), 'set "constant" on species '+str(species_id))
+            self._checklibSBML(spe.setStoichiometry(float(stoichiometry)), 'set stoichiometry ('+str(stoichiometry)+')')
+        for species_id, stoichiometry in fields['products']:
+            pro = reac.createProduct()
+            self._checklibSBML(pro.setSpecies(species_id), 'assign product species')
+            self._checklibSBML(pro.setConstant(True), 'set "constant" on species '+str(species_id))
+            self._checklibSBML(pro.setStoichiometry(float(stoichiometry)), 'set stoichiometry ('+str(stoichiometry)+')')
+        if 'gene_product_association' in fields:
+            self._createAssociationFields(reac_fbc.createGeneProductAssociation(), fields['gene_product_association'])
+        self._setAnnotationFields(reac, fields)
+        return reac
+
+
+    def _genGeneProductFields(self, gene_product):
+        """Private function that returns the interchange entry of a gene product
+
+        :param gene_product: The libSBML gene product
+
+        :type gene_product: libsbml.GeneProduct
+
+        :rtype: dict
+        :return: The interchange entry of the gene product
+        """
+        return self._genAnnotationFields(gene_product, {
+            'id': gene_product.getId(),
+            'name': gene_product.getName(),
+            'label': gene_product.getLabel(),
+            'associated_species': gene_product.getAssociatedSpecies()})
+
+
+    def _createGeneProductFields(self, fields):
+        """Private function that creates a gene product from its interchange entry
+
+        :param fields: The interchange entry of the gene product
+
+        :type fields: dict
+
+        :rtype: None
+        :return: None
+        """
+        gene_product = self.model.getPlugin('fbc').createGeneProduct()
+        self._checklibSBML(gene_product.setId(fields['id']), 'setting gene product id')
+        if fields['name']:
+            self._checklibSBML(gene_product.setName(fields['name']), 'setting gene product name')
+        self._checklibSBML(gene_product.setLabel(fields['label']), 'setting gene product label')
+        if fields['associated_species']:
+            self._checklibSBML(gene_product.setAssociatedSpecies(fields['associated_species']), 'setting gene product associated species')
+        self._setAnnotationFields(gene_product, fields)
+
+
+    def genInterchange(self):
+        """Generate the interchange representation of the model
+
+        The interchange representation contains the same information as genJSON for all the elements of the model
+        (compartments, unit definitions, parameters, species, reactions with stoichiometry and bounds, groups and flux
+        objectives, gene products and their associations to the reactions) as typed fields, and can be serialised in
+        JSON or msgpack with rpInterchange, read without libSBML and converted back to SBML with readInterchange. The
+        annotations are limited to the MIRIAM (bqbiol:is) and BRSynth entries, and notes and kinetic laws are not kept.
+        The non-finite floats are written as strings
+
+        :rtype: dict
+        :return: Dictionnary of the model
+        """
+        model_fbc = self.model.getPlugin('fbc')
+        groups = self.model.getPlugin('groups')
+        toRet = {'format': 'rpsbml', 'version': 1}
+        toRet['model'] = self._genAnnotationFields(self.model, {
+            'id': self.model.getId(),
+            'name': self.model.getName(),
+            'time_units': self.model.getTimeUnits(),
+            'extent_units': self.model.getExtentUnits(),
+            'substance_units': self.model.getSubstanceUnits(),
+            'strict': model_fbc.getStrict() if model_fbc else False})
+        toRet['unit_definitions'] = []
+        for unit_def in self.model.getListOfUnitDefinitions():
+            toRet['unit_definitions'].append(self._genAnnotationFields(unit_def, {
+                'id': unit_def.getId(),
+                'units': [{'kind': libsbml.UnitKind_toString(unit.getKind()),
+                           'exponent': self._interchangeFloat(unit.getExponentAsDouble()),
+                           'scale': unit.getScale(),
+                           'multiplier': self._interchangeFloat(unit.getMultiplier())} for unit in unit_def.getListOfUnits()]}))
+        toRet['compartments'] = []
+        for comp in self.model.getListOfCompartments():
+            toRet['compartments'].append(self._genAnnotationFields(comp, {
+                'id': comp.getId(),
+                'name': comp.getName(),
+                'size': self._interchangeFloat(comp.getSize()),
+                'constant': comp.getConstant()}))
+        toRet['parameters'] = []
+        for param in self.model.getListOfParameters():
+            toRet['parameters'].append(self._genAnnotationFields(param, {
+                'id': param.getId(),
+                'value': self._interchangeFloat(param.getValue()),
+                'units': param.getUnits(),
+                'constant': param.getConstant()}))
+        toRet['species'] = []
+        for spe in self.model.getListOfSpecies():
+            toRet['species'].append(self._genSpeciesFields(spe))
+        toRet['reactions'] = []
+        for reac in self.model.getListOfReactions():
+            toRet['reactions'].append(self._genReactionFields(reac))
+        toRet['groups'] = []
+        if groups:
+            for group in groups.getListOfGroups():
+                toRet['groups'].append(self._genAnnotationFields(group, {
+                    'id': group.getId(),
+                    'name': group.getName(),
+                    'kind': group.getKindAsString(),
+                    'members': [i.getIdRef() for i in group.getListOfMembers()]}))
+        toRet['objectives'] = []
+        toRet['active_objective'] = ''
+        toRet['gene_products'] = []
+        if model_fbc:
+            toRet['active_objective'] = model_fbc.getActiveObjectiveId()
+            for objective in model_fbc.getListOfObjectives():
+                toRet['objectives'].append(self._genAnnotationFields(objective, {
+                    'id': objective.getId(),
+                    'type': objective.getType(),
+                    'flux_objectives': [[i.getReaction(), self._interchangeFloat(i.getCoefficient())] for i in objective.getListOfFluxObjectives()]}))
+            for gene_product in model_fbc.getListOfGeneProducts():
+                toRet['gene_products'].append(self._genGeneProductFields(gene_product))
+        return toRet
+
+
+    def readInterchange(self, data):
+        """Set the model of the object from its interchange representation
+
+        See genInterchange for the content of the interchange representation
+
+        :param data: The interchange representation of the model (as returned by genInterchange or rpInterchange.loads)
+        
+        :type data: dict
+
+        :raises AttributeError: If the libSBML command encounters an error or the input value is None
+
+        :rtype: bool
+        :return: Success or failure of the function
+        """
+        if not data.get('format')=='rpsbml':
+            self.logger.error('The data is not a rpSBML interchange representation')
+            return False
+        if data.get('version', 0)>1:
+            self.logger.error('Unsupported version of the interchange representation: '+str(data.get('version')))
+            return False
+        self.createModel(data['model']['name'], data['model']['id'], data['model'].get('meta_id'))
+        if not 'meta_id' in data['model']:
+            self.model.unsetMetaId()
+        self._setAnnotationFields(self.model, data['model'])
+        self._checklibSBML(self.model.getPlugin('fbc').setStrict(data['model']['strict']), 'setting FBC strict')
+        for units_type in ['time_units', 'extent_units', 'substance_units']:
+            if data['model'][units_type]:
+                self._checklibSBML(getattr(self.model, 'set'+''.join([i.capitalize() for i in units_type.split('_')]))(data['model'][units_type]), 'setting model '+str(units_type))
+            else:
+                getattr(self.model, 'unset'+''.join([i.capitalize() for i in units_type.split('_')]))()
+        for fields in data['unit_definitions']:
+            unit_def = self.model.createUnitDefinition()
+            self._checklibSBML(unit_def.setId(fields['id']), 'setting unit definition id')
+            self._setAnnotationFields(unit_def, fields)
+            for unit_fields in fields['units']:
+                unit = unit_def.createUnit()
+                self._checklibSBML(unit.setKind(libsbml.UnitKind_forName(unit_fields['kind'])), 'setting the kind of unit')
+                self._checklibSBML(unit.setExponent(float(unit_fields['exponent'])), 'setting the exponenent of the unit')
+                self._checklibSBML(unit.setScale(unit_fields['scale']), 'setting the scale of the unit')
+                self._checklibSBML(unit.setMultiplier(float(unit_fields['multiplier'])), 'setting the multiplier of the unit')
+        for fields in data['compartments']:
+            comp = self.model.createCompartment()
+            self._checklibSBML(comp.setId(fields['id']), 'set compartment id')
+            if fields['name']:
+                self._checklibSBML(comp.setName(fields['name']), 'set compartment name')
+            self._checklibSBML(comp.setConstant(fields['constant']), 'set compartment "constant"')
+            self._checklibSBML(comp.setSize(float(fields['size'])), 'set compartment "size"')
+            self._setAnnotationFields(comp, fields)
+        for fields in data['parameters']:
+            param = self.model.createParameter()
+            self._checklibSBML(param.setId(fields['id']), 'setting parameter ID')
+            self._checklibSBML(param.setConstant(fields['constant']), 'setting parameter constant')
+            self._checklibSBML(param.setValue(float(fields['value'])), 'setting parameter value')
+            if fields['units']:
+                self._checklibSBML(param.setUnits(fields['units']), 'setting parameter units')
+            self._setAnnotationFields(param, fields)
+        for fields in data['species']:
+            self._createSpeciesFields(fields)
+        for fields in data['reactions']:
+            self._createReactionFields(fields)
+        groups = self.model.getPlugin('groups')
+        for fields in data['groups']:
+            group = groups.createGroup()
+            self._checklibSBML(group.setId(fields['id']), 'setting group id')
+            if fields['name']:
+                self._checklibSBML(group.setName(fields['name']), 'setting group name')
+            self._checklibSBML(group.setKind(fields['kind']), 'setting group kind')
+            for member_id in fields['members']:
+                self._checklibSBML(group.createMember().setIdRef(member_id), 'Setting name to the groups member')
+            self._setAnnotationFields(group, fields)
+        model_fbc = self.model.getPlugin('fbc')
+        for fields in data.get('gene_products', []):
+            self._createGeneProductFields(fields)
+        for fields in data['objectives']:
+            objective = model_fbc.createObjective()
+            self._checklibSBML(objective.setId(fields['id']), 'setting objective id')
+            self._checklibSBML(objective.setType(fields['type']), 'setting objective type')
+            for reaction_id, coefficient in fields['flux_objectives']:
+                flux_obj = objective.createFluxObjective()
+                self._checklibSBML(flux_obj.setReaction(reaction_id), 'setting flux objective reaction')
+                self._checklibSBML(flux_obj.setCoefficient(float(coefficient)), 'setting flux objective coefficient')
+            self._setAnnotationFields(objective, fields)
+        if data['active_objective']:
+            self._checklibSBML(model_fbc.setActiveObjectiveId(data['active_objective']), 'setting active objective')
+        return True
+
+
+    def genPathway(self, pathway_id='rp_pathway'):
+        """Return the pathway as a rpPathway object that is detached from libSBML
+
+        The object holds the reactions of the pathway, their species, the gene products that are referenced by the
+        reactions or associated to the reactions or species, the annotation of the pathway group and the members of the
+        other groups that are part of the pathway. It can be written back to a model with addPathway. The gene products
+        that cannot be attributed to a pathway (not referenced by a reaction and associated to no element of the
+        model) are not kept and a warning is logged
+
+        :param pathway_id: The pathway ID (Default: rp_pathway)
+
+        :type pathway_id: str
+
+        :rtype: rpPathway.rpPathway
+        :return: The pathway
+        """
+        groups = self.model.getPlugin('groups')
+        rp_pathway = groups.getGroup(pathway_id)
+        if not rp_pathway:
+            self.logger.error('The pathway_id '+str(pathway_id)+' does not exist in the model')
+            return None
+        pathway = rpPathway.rpPathway.fromFields(self._genAnnotationFields(rp_pathway, {
+            'id': pathway_id,
+            'name': rp_pathway.getName(),
+            'kind': rp_pathway.getKindAsString(),
+            'model_id': self.model.getId(),
+            'model_name': self.model.getName()}))
+        for reaction_id in self.readRPpathwayIDs(pathway_id):
+            fields = self._genReactionFields(self.model.getReaction(reaction_id))
+            for bound in ['lower_bound', 'upper_bound']:
+                param = self.model.getParameter(fields[bound])
+                fields[bound] = param.getValue() if param else None
+                if param and param.getUnits():
+                    fields['units'] = param.getUnits()
+            pathway.addReaction(rpPathway.rpReaction.fromFields(fields))
+        elements = set(pathway.reactions)
+        for species_id in self.readUniqueRPspecies(pathway_id):
+            pathway.addSpecies(rpPathway.rpSpecies.fromFields(self._genSpeciesFields(self.model.getSpecies(species_id))))
+            elements.add(species_id)
+        model_fbc = self.model.getPlugin('fbc')
+        if model_fbc:
+            gene_product_ids = set([y for i in pathway.reactions.values() if i.gene_product_association for y in self._associationGeneProducts(i.gene_product_association)])
+            referenced_ids = set()
+            for reac in self.model.getListOfReactions():
+                reac_fbc = reac.getPlugin('fbc')
+                if reac_fbc and reac_fbc.isSetGeneProductAssociation() and reac_fbc.getGeneProductAssociation().isSetAssociation():
+                    referenced_ids.update(self._associationGeneProducts(self._genAssociationFields(reac_fbc.getGeneProductAssociation().getAssociation())))
+            for gene_product in model_fbc.getListOfGeneProducts():
+                #createGene associates the gene products to the reactions of the steps
+                if gene_product.getId() in gene_product_ids or gene_product.getAssociatedSpecies() in elements:
+                    pathway.addGeneProduct(rpPathway.rpGeneProduct.fromFields(self._genGeneProductFields(gene_product)))
+                elif not gene_product.getId() in referenced_ids and not self.model.getElementBySId(gene_product.getAssociatedSpecies()):
+                    self.logger.warning('The gene product '+str(gene_product.getId())+' is not referenced by a reaction and its associated species ('+str(gene_product.getAssociatedSpecies())+') does not exist: it is not part of the pathway')
+        for group in groups.getListOfGroups():
+            if not group.getId()==pathway_id:
+                members = [i.getIdRef() for i in group.getListOfMembers() if i.getIdRef() in elements]
+                if members:
+                    pathway.groups[group.getId()] = tuple(members)
+        return pathway
+
+
+    def addPathway(self, pathway):
+        """Add a rpPathway object to the model
+
+        The species and gene products that do not exist in the model are created, as well as the pathway group and
+        the other groups of the pathway. The reactions that already exist in the model are not replaced. If the object
+        has no model, a generic model (see genericModel) is created with the compartments of the species
+
+        :param pathway: The pathway (as returned by genPathway)
+
+        :type pathway: rpPathway.rpPathway
+
+        :rtype: bool
+        :return: Success or failure of the function
+        """
+        if self.model==None:
+            compartments = list(dict.fromkeys([i.compartment for i in pathway.species.values()])) or ['MNXC3']
+            self.genericModel(pathway.model_name or pathway.model_id, pathway.model_id, {}, compartments[0])
+            for compartment_id in compartments[1:]:
+                self.createCompartment(1, compartment_id, compartment_id+'_name', {})
+        groups = self.model.getPlugin('groups')
+        if not groups.getGroup(pathway.id):
+            self.createPathway(pathway.id, pathway.meta_id)
+        self._setAnnotationFields(groups.getGroup(pathway.id), pathway.toFields())
+        for species in pathway.species.values():
+            if not self.model.getSpecies(species.id):
+                self._createSpeciesFields(species.toFields())
+                self.notifyChange('species_created', species.id)
+        model_fbc = self.model.getPlugin('fbc')
+        for gene_product in pathway.gene_products.values():
+            if not model_fbc.getGeneProduct(gene_product.id):
+                self._createGeneProductFields(gene_product.toFields())
+                self.markDirty()
+        for reaction in pathway.reactions.values():
+            if self.model.getReaction(reaction.id):
+                self.logger.warning('The reaction '+str(reaction.id)+' already exists in the model')
+            else:
+                fields = reaction.toFields()
+                for bound in ['lower_bound', 'upper_bound']:
+                    if fields.get(bound) is not None:
+                        fields[bound] = self.createReturnFluxParameter(fields[bound], fields.get('units', 'mmol_per_gDW_per_hr')).getId()
+                    else:
+                        fields[bound] = ''
+                self._createReactionFields(fields)
+                self.notifyChange('reaction_created', reaction.id)
+        for group_id, members in [(pathway.id, list(pathway.reactions))]+list(pathway.groups.items()):
+            if not groups.getGroup(group_id):
+                self.createPathway(group_id)
+            group = groups.getGroup(group_id)
+            current = set([i.getIdRef() for i in group.getListOfMembers()])
+            for member_id in members:
+                if not member_id in current:
+                    self._checklibSBML(group.createMember().setIdRef(member_id), 'Setting name to the groups member')
+                    self.notifyChange('group_member_added', member_id, group_id)
         return True
 
 
@@ -707,6 +1797,149 @@ class rpSBML:
         return objective_id
 
 
+    #####################################################################
+    ########################## FLUX BALANCE #############################
+    #####################################################################
+
+
+    def genLP(self, objective_id=None):
+        """Return the linear program of the flux balance analysis of the model
+
+        The rows are the species that are not boundary conditions (in the order of the model), the columns are the
+        reactions (in the order of the model), the bounds are the values of the fbc flux bound parameters (-inf and
+        inf for the reactions without bounds, 0 for the lower bound of the irreversible ones) and the objective
+        coefficients are the ones of the flux objectives. See rpFBA to store the linear program of a chassis as a
+        memory mappable bundle
+
+        :param objective_id: The id of the objective (Default: None, the active objective)
+
+        :type objective_id: str
+
+        :rtype: dict
+        :return: Dictionnary of the species and reaction ids, the sparse stoichiometry matrix (S), the bounds (lb, ub), the objective coefficients (c), the objective id and its sense (maximize or minimize)
+        """
+        values = {i.getId(): i.getValue() for i in self.model.getListOfParameters()}
+        rows = {}
+        for spe in self.model.getListOfSpecies():
+            if not spe.getBoundaryCondition():
+                rows[spe.getId()] = len(rows)
+        reaction_ids = []
+        S_rows = []
+        S_cols = []
+        S_data = []
+        lb = np.empty(self.model.getNumReactions())
+        ub = np.empty(self.model.getNumReactions())
+        for col, reac in enumerate(self.model.getListOfReactions()):
+            reaction_ids.append(reac.getId())
+            for sign, species_refs in [(-1.0, reac.getListOfReactants()), (1.0, reac.getListOfProducts())]:
+                for spe_ref in species_refs:
+                    if spe_ref.getSpecies() in rows:
+                        S_rows.append(rows[spe_ref.getSpecies()])
+                        S_cols.append(col)
+                        S_data.append(sign*spe_ref.getStoichiometry())
+            reac_fbc = reac.getPlugin('fbc')
+            lb[col] = values.get(reac_fbc.getLowerFluxBound(), -np.inf) if reac_fbc else -np.inf
+            ub[col] = values.get(reac_fbc.getUpperFluxBound(), np.inf) if reac_fbc else np.inf
+            if not reac.getReversible():
+                lb[col] = max(lb[col], 0.0)
+        #duplicated species references are summed by the conversion to CSC
+        S = sparse.csc_matrix((S_data, (S_rows, S_cols)), shape=(len(rows), len(reaction_ids)))
+        ########## objective ################
+        c = np.zeros(len(reaction_ids))
+        sense = 'maximize'
+        model_fbc = self.model.getPlugin('fbc')
+        if objective_id==None and model_fbc:
+            objective_id = model_fbc.getActiveObjectiveId()
+        objective = model_fbc.getObjective(objective_id) if model_fbc and objective_id else None
+        if objective:
+            sense = objective.getType()
+            cols = {i: y for y, i in enumerate(reaction_ids)}
+            for flux_obj in objective.getListOfFluxObjectives():
+                if flux_obj.getReaction() in cols:
+                    c[cols[flux_obj.getReaction()]] += flux_obj.getCoefficient()
+        elif objective_id:
+            self.logger.warning('Cannot find the objective: '+str(objective_id))
+        return {'species': list(rows),
+                'reactions': reaction_ids,
+                'S': S,
+                'lb': lb,
+                'ub': ub,
+                'c': c,
+                'objective_id': objective_id or None,
+                'sense': sense}
+
+
+    def fba(self, objective_id=None, pathway_id='rp_pathway', solver=None):
+        """Run the flux balance analysis of the model and write the results as fba_ annotations
+
+        The linear program of the model (see genLP) is solved with the HiGHS solver of scipy, or, to solve many models
+        merged into the same chassis, with a rpFBA.rpBatchFBA solver of the chassis that is reused (and warm started)
+        between the models. The results are written with updateFBA
+
+        :param objective_id: The id of the objective (Default: None, the active objective)
+        :param pathway_id: The pathway ID (Default: rp_pathway)
+        :param solver: The batch solver of the chassis of the model (Default: None)
+
+        :type objective_id: str
+        :type pathway_id: str
+        :type solver: rpFBA.rpBatchFBA
+
+        :rtype: dict
+        :return: Dictionnary of the objective id, status (optimal if the solution is optimal), objective value and fluxes (dictionnary of the reaction ids and their flux)
+        """
+        lp = self.genLP(objective_id)
+        if solver:
+            delta = rpFBA.genDelta(solver.chassis, lp)
+            result = solver.solveDelta(delta)
+            reaction_ids = list(solver.chassis['reactions'])+delta['reactions']
+        else:
+            result = rpFBA.solve(lp)
+            reaction_ids = lp['reactions']
+        result['objective_id'] = lp['objective_id']
+        if result['status']=='optimal':
+            result['fluxes'] = dict(zip(reaction_ids, result['fluxes'].tolist()))
+            self.updateFBA(lp['objective_id'], result['objective_value'], result['fluxes'], pathway_id)
+        else:
+            result['fluxes'] = {}
+        return result
+
+
+    def updateFBA(self, objective_id, objective_value, fluxes, pathway_id='rp_pathway', units='mmol_per_gDW_per_hr'):
+        """Write the results of a flux balance analysis as BRSynth annotations
+
+        The value of the objective is written as fba_[objective_id] on the pathway group and as flux_value on the
+        objective, and the flux of each reaction of the pathway as fba_[objective_id] on the reaction
+
+        :param objective_id: The id of the objective
+        :param objective_value: The value of the objective
+        :param fluxes: Dictionnary of the reaction ids and their flux
+        :param pathway_id: The pathway ID (Default: rp_pathway)
+        :param units: The units of the fluxes (Default: mmol_per_gDW_per_hr)
+
+        :type objective_id: str
+        :type objective_value: float
+        :type fluxes: dict
+        :type pathway_id: str
+        :type units: str
+
+        :rtype: None
+        :return: None
+        """
+        groups = self.model.getPlugin('groups')
+        rp_pathway = groups.getGroup(pathway_id) if groups else None
+        if rp_pathway:
+            self.addUpdateBRSynth(rp_pathway, 'fba_'+str(objective_id), objective_value, units, False)
+            reaction_ids = [i.getIdRef() for i in rp_pathway.getListOfMembers() if i.getIdRef() in fluxes and self.model.getReaction(i.getIdRef())]
+            self.addUpdateBRSynthMany('fba_'+str(objective_id), reaction_ids, np.array([fluxes[i] for i in reaction_ids]), units)
+        else:
+            self.logger.warning('The pathway_id '+str(pathway_id)+' does not exist in the model')
+        model_fbc = self.model.getPlugin('fbc')
+        objective = model_fbc.getObjective(objective_id) if model_fbc else None
+        if objective:
+            self.addUpdateBRSynth(objective, 'flux_value', objective_value, units, False)
+        self.markDirty()
+
+
     #####################################################################
     ########################## READ #####################################
     #####################################################################
@@ -734,6 +1967,21 @@ class rpSBML:
         return toRet
 
 
+    def readGroupIDs(self, prefix=None):
+        """Return the ids of the groups of the model
+
+        :param prefix: Only return the groups whose id starts with the prefix (Default: None)
+        
+        :type prefix: str
+
+        :rtype: list
+        :return: List of the groups id's
+        """
+        groups = self.model.getPlugin('groups')
+        self._checklibSBML(groups, 'retreiving the groups plugin')
+        return [i.getId() for i in groups.getListOfGroups() if prefix==None or i.getId().startswith(prefix)]
+
+
     def readRPrules(self, pathway_id='rp_pathway'):
         """Return the list of reaction rules contained within a pathway
 
@@ -788,7 +2036,7 @@ class rpSBML:
         :rtype: list
         :return: List of unique species
         """
-        rpSpecies = self.readRPspecies()
+        rpSpecies = self.readRPspecies(pathway_id)
         toRet = []
         for i in rpSpecies:
             for y in rpSpecies[i]:
@@ -1104,6 +2352,66 @@ class rpSBML:
     #########################################################################
 
 
+    def _speciesIdentity(self, species_id):
+        """Private function that returns a canonical identity of a species that does not depend on its id
+
+        The InChIKey is used if it exists (BRSynth or MIRIAM annotation), then the MetaNetX cross reference and
+        finally the id of the species. The compartment is always part of the identity
+
+        :param species_id: The id of the species
+
+        :type species_id: str
+
+        :rtype: str
+        :return: The identity of the species
+        """
+        species = self.model.getSpecies(species_id)
+        if not species:
+            return 'id:'+str(species_id)
+        annot = species.getAnnotation()
+        brsynth = self.readBRSYNTHAnnotation(annot) if annot else {}
+        miriam = self.readMIRIAMAnnotation(annot)
+        if brsynth.get('inchikey'):
+            identity = 'inchikey:'+brsynth['inchikey']
+        elif miriam.get('inchikey'):
+            identity = 'inchikey:'+sorted(miriam['inchikey'])[0]
+        elif miriam.get('metanetx'):
+            identity = 'mnx:'+sorted(miriam['metanetx'])[0]
+        else:
+            identity = 'id:'+species_id
+        return identity+'@'+species.getCompartment()
+
+
+    def pathwayFingerprint(self, pathway_id='rp_pathway'):
+        """Return a hash of a pathway that does not depend on the ids and order of its reactions
+
+        Each reaction is written with the canonical identities of its species (see _speciesIdentity) and their
+        stoichiometry, and the sorted reactions are hashed. Two pathways with the same fingerprint have the same
+        reactions, regardless of the reaction ids, the step numbering and the species ids
+
+        :param pathway_id: The pathway ID (Default: rp_pathway)
+
+        :type pathway_id: str
+
+        :rtype: str
+        :return: The hexadecimal MD5 fingerprint of the pathway
+        """
+        identities = {}
+        reactions = []
+        for reaction_id in self.readRPpathwayIDs(pathway_id):
+            reaction = self.model.getReaction(reaction_id)
+            sides = []
+            for species_refs in [reaction.getListOfReactants(), reaction.getListOfProducts()]:
+                side = []
+                for spe in species_refs:
+                    if not spe.getSpecies() in identities:
+                        identities[spe.getSpecies()] = self._speciesIdentity(spe.getSpecies())
+                    side.append(identities[spe.getSpecies()]+'*'+repr(float(spe.getStoichiometry())))
+                sides.append('+'.join(sorted(side)))
+            reactions.append('>>'.join(sides))
+        return md5('\n'.join(sorted(reactions)).encode('utf-8')).hexdigest()
+
+
     def compareBRSYNTHAnnotations(self, source_annot, target_annot):
         """Determine if two libsbml species or reactions have members in common in BRSynth annotation
         
@@ -1344,9 +2652,79 @@ class rpSBML:
         lower_param = self.createReturnFluxParameter(lower_bound, unit, is_constant)
         self._checklibSBML(reac_fbc.setLowerFluxBound(lower_param.getId()),
             'setting '+str(reaction_id)+' lower flux bound')
+        self.notifyChange('reaction_updated', reaction_id)
         return old_upper_value, old_lower_value
 
 
+    def setReactionConstraintsMany(self,
+                                   constraints,
+                                   unit='mmol_per_gDW_per_hr',
+                                   is_constant=True):
+        """Set the upper and lower bounds of many reactions in a single pass
+
+        The bound parameters are resolved with an index of the flux bound parameters of the model by value and unit,
+        so that existing parameters are reused (including the ones that do not follow the B_ naming convention) and new
+        ones are created with createReturnFluxParameter only when no parameter has the value
+
+        :param constraints: Dictionnary of the reaction id and the tuple of its lower and upper bounds, table (pandas.DataFrame) or path to a CSV file with the columns reaction_id, lower_bound and upper_bound
+        :param unit: Unit to the bounds (Default: mmol_per_gDW_per_hr)
+        :param is_constant: Set if the created parameters are constant (Default: True)
+
+        :type constraints: Union[dict, pandas.DataFrame, str]
+        :type unit: str
+        :type is_constant: bool
+
+        :rtype: tuple
+        :return: Tuple of the list of the reaction ids and the arrays of their old lower and upper bounds (nan if the reaction cannot be found)
+        """
+        if isinstance(constraints, str):
+            with open(constraints, newline='') as in_file:
+                constraints = {row['reaction_id']: (float(row['lower_bound']), float(row['upper_bound'])) for row in csv.DictReader(in_file)}
+        elif not isinstance(constraints, dict):
+            if 'reaction_id' in constraints.columns:
+                constraints = constraints.set_index('reaction_id')
+            constraints = {i: (row.lower_bound, row.upper_bound) for i, row in zip(constraints.index, constraints.itertuples())}
+        ########## index of the model #######
+        reactions = {}
+        bound_ids = set()
+        for reaction in self.model.getListOfReactions():
+            reactions[reaction.getId()] = reaction
+            reac_fbc = reaction.getPlugin('fbc')
+            if reac_fbc:
+                bound_ids.add(reac_fbc.getUpperFluxBound())
+                bound_ids.add(reac_fbc.getLowerFluxBound())
+        values = {}
+        param_index = {}
+        for param in self.model.getListOfParameters():
+            values[param.getId()] = param.getValue()
+            if param.getId() in bound_ids or param.getSBOTerm()==625:
+                param_index.setdefault((param.getValue(), param.getUnits()), param.getId())
+        ########## set the bounds ###########
+        reaction_ids = list(constraints)
+        old_lower = np.full(len(reaction_ids), np.nan)
+        old_upper = np.full(len(reaction_ids), np.nan)
+        for i, reaction_id in enumerate(reaction_ids):
+            if not reaction_id in reactions:
+                self.logger.error('Cannot find the reaction: '+str(reaction_id))
+                continue
+            reac_fbc = reactions[reaction_id].getPlugin('fbc')
+            self._checklibSBML(reac_fbc, 'extending reaction for FBC')
+            old_lower[i] = values.get(reac_fbc.getLowerFluxBound(), np.nan)
+            old_upper[i] = values.get(reac_fbc.getUpperFluxBound(), np.nan)
+            param_ids = []
+            for value in constraints[reaction_id]:
+                key = (float(value), unit)
+                if not key in param_index:
+                    param = self.createReturnFluxParameter(float(value), unit, is_constant)
+                    param_index[key] = param.getId()
+                    values[param.getId()] = param.getValue()
+                param_ids.append(param_index[key])
+            self._checklibSBML(reac_fbc.setLowerFluxBound(param_ids[0]), 'setting '+str(reaction_id)+' lower flux bound')
+            self._checklibSBML(reac_fbc.setUpperFluxBound(param_ids[1]), 'setting '+str(reaction_id)+' upper flux bound')
+            self.notifyChange('reaction_updated', reaction_id)
+        return reaction_ids, old_lower, old_upper
+
+
     ##### ADD SOURCE FROM ORPHAN #####
     #if the heterologous pathway from the self.model contains a sink molecule that is not included in the 
     # original model (we call orhpan species) then add another reaction that creates it
@@ -1407,6 +2785,124 @@ class rpSBML:
                                         compartment_id)
 
 
+    #########################################################################
+    ############################# CLEAN UP ##################################
+    #########################################################################
+
+
+    def _mathNames(self, math, names):
+        """Private function that adds the names (ids of species, parameters, etc...) used in a math expression
+
+        :param math: The math expression
+        :param names: The set of names to update
+
+        :type math: libsbml.ASTNode
+        :type names: set
+
+        :rtype: None
+        :return: None
+        """
+        stack = [math]
+        while stack:
+            node = stack.pop()
+            if node.getName():
+                names.add(node.getName())
+            if node.isSetUnits():
+                names.add(node.getUnits())
+            stack += [node.getChild(i) for i in range(node.getNumChildren())]
+
+
+    def compact(self, keep_groups=True):
+        """Remove the parameters, unit definitions, gene products and species that are not used in the model
+
+        The references of each type of element are counted in a single pass over the model, and the elements that
+        are never referenced are removed. Parameters are referenced by the flux bounds, the math expressions, the rules,
+        the initial and event assignments and the conversion factors. Unit definitions are referenced by the units
+        attributes (including the units of the BRSynth annotations), and the units of genericModel are always kept. Gene products are referenced by the gene product
+        associations of the reactions or by their associated species. Species are referenced by the reactions, the
+        math expressions and the assignments, and, if keep_groups is True, by the groups
+
+        :param keep_groups: Keep the species that are members of a group (Default: True)
+
+        :type keep_groups: bool
+
+        :rtype: dict
+        :return: Dictionnary of the number of removed elements of each type (parameters, unit_definitions, gene_products, species, group_members) and of the number of bytes saved in the SBML (bytes)
+        """
+        before = libsbml.writeSBMLToString(self.document)
+        names = set()
+        species_refs = set()
+        #units are used either as SBML or annotation attributes, and the units of genericModel are used by default by the rpSBML functions
+        units_refs = set(re.findall(r'\bunits="([^"]*)"', before))|set(['mmol_per_gDW_per_hr', 'kj_per_mol'])
+        for attr in ['getTimeUnits', 'getExtentUnits', 'getSubstanceUnits', 'getVolumeUnits', 'getAreaUnits', 'getLengthUnits', 'getConversionFactor']:
+            names.add(getattr(self.model, attr)())
+        elements = self.model.getListOfAllElements()
+        for i in range(elements.getSize()):
+            element = elements.get(i)
+            if hasattr(element, 'isSetMath') and element.isSetMath():
+                self._mathNames(element.getMath(), names)
+            for attr in ['getVariable', 'getSymbol', 'getConversionFactor', 'getSubstanceUnits', 'getSpatialSizeUnits']:
+                if hasattr(element, attr):
+                    names.add(getattr(element, attr)())
+        ########## reactions ###########
+        gene_refs = set()
+        for reaction in self.model.getListOfReactions():
+            for spe in list(reaction.getListOfReactants())+list(reaction.getListOfProducts())+list(reaction.getListOfModifiers()):
+                species_refs.add(spe.getSpecies())
+            reac_fbc = reaction.getPlugin('fbc')
+            if reac_fbc:
+                names.add(reac_fbc.getLowerFluxBound())
+                names.add(reac_fbc.getUpperFluxBound())
+                if reac_fbc.isSetGeneProductAssociation():
+                    stack = [reac_fbc.getGeneProductAssociation().getAssociation()]
+                    while stack:
+                        association = stack.pop()
+                        if association==None:
+                            continue
+                        if association.isGeneProductRef():
+                            gene_refs.add(association.getGeneProduct())
+                        else:
+                            stack += [association.getAssociation(y) for y in range(association.getNumAssociations())]
+        groups = self.model.getPlugin('groups')
+        if keep_groups:
+            for group in groups.getListOfGroups():
+                species_refs |= set([i.getIdRef() for i in group.getListOfMembers()])
+        species_refs |= names
+        units_refs |= names
+        ########## remove ##############
+        removed = {'parameters': 0, 'unit_definitions': 0, 'gene_products': 0, 'species': 0, 'group_members': 0}
+        for param_id in [i.getId() for i in self.model.getListOfParameters() if not i.getId() in names]:
+            self.model.removeParameter(param_id)
+            removed['parameters'] += 1
+        units_refs |= set([i.getUnits() for i in self.model.getListOfParameters()])
+        for unit_id in [i.getId() for i in self.model.getListOfUnitDefinitions() if not i.getId() in units_refs]:
+            self.model.removeUnitDefinition(unit_id)
+            removed['unit_definitions'] += 1
+        model_fbc = self.model.getPlugin('fbc')
+        if model_fbc:
+            element_ids = set([i.getId() for i in self.model.getListOfReactions()])|set([i.getId() for i in self.model.getListOfSpecies()])
+            for gene_id in [i.getId() for i in model_fbc.getListOfGeneProducts() if not i.getId() in gene_refs and not i.getAssociatedSpecies() in element_ids]:
+                model_fbc.removeGeneProduct(gene_id)
+                removed['gene_products'] += 1
+        removed_species = set([i.getId() for i in self.model.getListOfSpecies() if not i.getId() in species_refs])
+        for species_id in removed_species:
+            self.model.removeSpecies(species_id)
+            removed['species'] += 1
+            self.notifyChange('species_removed', species_id)
+        for group in groups.getListOfGroups():
+            for y in reversed(range(group.getNumMembers())):
+                if group.getMember(y).getIdRef() in removed_species:
+                    member_id = group.getMember(y).getIdRef()
+                    group.removeMember(y)
+                    removed['group_members'] += 1
+                    self.notifyChange('group_member_removed', member_id, group.getId())
+        if sum(removed.values()):
+            self.markDirty()
+        removed['bytes'] = len(before)-len(libsbml.writeSBMLToString(self.document))
+        self.logger.debug('Compacted the model: '+str(removed))
+        return removed
+
+
     #########################################################################
     ############################# MODEL CREATION FUNCTIONS ##################
     #########################################################################
@@ -1453,6 +2949,8 @@ class rpSBML:
         self._checklibSBML(self.model.setTimeUnits('second'), 'setting model time unit')
         self._checklibSBML(self.model.setExtentUnits('mole'), 'setting model compartment unit')
         self._checklibSBML(self.model.setSubstanceUnits('mole'), 'setting model substance unit')
+        self._source_path = None
+        self.markDirty()
 
 
     #TODO: set the compName as None by default. To do that you need to regenerate the compXref to
@@ -1490,6 +2988,7 @@ class rpSBML:
         ############################ MIRIAM ############################
         comp.setAnnotation(libsbml.XMLNode.convertStringToXMLNode(self._defaultMIRIAMAnnot(meta_id)))
         self.addUpdateMIRIAM(comp, 'compartment', compXref, meta_id)
+        self.markDirty()
 
 
     def createUnitDefinition(self, unit_id, meta_id=None):
@@ -1513,6 +3012,7 @@ class rpSBML:
             meta_id = self._genMetaID(unit_id)
         self._checklibSBML(unitDef.setMetaId(meta_id), 'setting meta_id')
         #self.unitDefinitions.append(unit_id)
+        self.markDirty()
         return unitDef
 
 
@@ -1540,6 +3040,7 @@ class rpSBML:
         self._checklibSBML(unit.setExponent(exponent), 'setting the exponenent of the unit')
         self._checklibSBML(unit.setScale(scale), 'setting the scale of the unit')
         self._checklibSBML(unit.setMultiplier(multiplier), 'setting the multiplier of the unit')
+        self.markDirty()
 
 
     def createReturnFluxParameter(self,
@@ -1575,7 +3076,7 @@ class rpSBML:
                 param_id = 'B_'+str(round(abs(value), 4)).replace('.', '_')
             else:
                 param_id = 'B__'+str(round(abs(value), 4)).replace('.', '_')
-        if param_id in [i.getId() for i in self.model.getListOfParameters()]:
+        if self.model.getParameter(param_id):
             return self.model.getParameter(param_id)
         else:
             newParam = self.model.createParameter()
@@ -1586,9 +3087,10 @@ class rpSBML:
             self._checklibSBML(newParam.setUnits(unit), 'setting units')
             self._checklibSBML(newParam.setSBOTerm(625), 'setting SBO term')
             if meta_id==None:
-                meta_id = self._genMetaID(parameter_id)
+                meta_id = self._genMetaID(param_id)
             self._checklibSBML(newParam.setMetaId(meta_id), 'setting meta ID')
             #self.parameters.append(parameter_id)
+            self.markDirty()
             return newParam
 
 
@@ -1700,6 +3202,8 @@ class rpSBML:
                 newM = hetero_group.createMember()
                 self._checklibSBML(newM, 'Creating a new groups member')
                 self._checklibSBML(newM.setIdRef(reac_id), 'Setting name to the groups member')
+                self.notifyChange('group_member_added', reac_id, pathway_id)
+        self.notifyChange('reaction_created', reac_id)
 
 
     def createSpecies(self,
@@ -1712,7 +3216,8 @@ class rpSBML:
                       smiles=None,
                       species_group_id=None,
                       in_sink_group_id=None,
-                      meta_id=None):
+                      meta_id=None,
+                      species_cache=None):
                       #TODO: add these at some point -- not very important
                       #charge=0,
                       #chemForm=''):
@@ -1730,6 +3235,7 @@ class rpSBML:
         :param species_group_id: The Groups id to add the species (Default: None)
         :param in_sink_group_id: The Groups id sink species to add the species (Default: None)
         :param meta_id: Meta id (Default: None)
+        :param species_cache: Dictionnary of the species already created with the same parameters (and their annotation), that are copied instead of being created again. Share it between the models that contain the same species (Default: None)
         
         :type species_id: str
         :type compartment_id: str
@@ -1741,54 +3247,61 @@ class rpSBML:
         :type species_group_id: str
         :type in_sink_group_id: str
         :type meta_id: str
+        :type species_cache: dict
 
         :rtype: None
         :return: None
         """
-        spe = self.model.createSpecies()
-        self._checklibSBML(spe, 'create species')
-        ##### FBC #####
-        spe_fbc = spe.getPlugin('fbc')
-        self._checklibSBML(spe_fbc, 'creating this species as an instance of FBC')
-        #spe_fbc.setCharge(charge) #### These are not required for FBA
-        #spe_fbc.setChemicalFormula(chemForm) #### These are not required for FBA
-        #if compartment_id:
-        self._checklibSBML(spe.setCompartment(compartment_id), 'set species spe compartment')
-        #else:
-        #    #removing this could lead to errors with xref
-        #    self._checklibSBML(spe.setCompartment(self.compartment_id), 'set species spe compartment')
-        #ID same structure as cobrapy
-        #TODO: determine if this is always the case or it will change
-        self._checklibSBML(spe.setHasOnlySubstanceUnits(False), 'set substance units')
-        self._checklibSBML(spe.setBoundaryCondition(False), 'set boundary conditions')
-        self._checklibSBML(spe.setConstant(False), 'set constant')
-        #useless for FBA (usefull for ODE) but makes Copasi stop complaining
-        self._checklibSBML(spe.setInitialConcentration(1.0), 'set an initial concentration')
-        #same writting convention as COBRApy
-        self._checklibSBML(spe.setId(str(species_id)+'__64__'+str(compartment_id)), 'set species id')
-        self.logger.debug('Setting species id as: '+str(species_id)+'__64__'+str(compartment_id))
-        if meta_id==None:
-            meta_id = self._genMetaID(species_id)
-        self._checklibSBML(spe.setMetaId(meta_id), 'setting reaction meta_id')
-        if species_name==None:
-            self._checklibSBML(spe.setName(species_id), 'setting name for the metabolite '+str(species_id))
+        cache_key = (species_id, compartment_id, species_name, meta_id, str(chemXref), inchi, inchikey, smiles)
+        if not species_cache is None and cache_key in species_cache:
+            self._checklibSBML(self.model.addSpecies(species_cache[cache_key]), 'copy the species '+str(species_id))
         else:
-            self._checklibSBML(spe.setName(species_name), 'setting name for the metabolite '+str(species_name))
-        #this is setting MNX id as the name
-        #this is setting the name as the input name
-        #self._checklibSBML(spe.setAnnotation(self._defaultBRSynthAnnot(meta_id)), 'creating annotation')
-        self._checklibSBML(spe.setAnnotation(self._defaultBothAnnot(meta_id)), 'creating annotation')
-        ###### annotation ###
-        self.addUpdateMIRIAM(spe, 'species', chemXref, meta_id)
-        ###### BRSYNTH additional information ########
-        if smiles:
-            self.addUpdateBRSynth(spe, 'smiles', smiles, None, True, False, False, meta_id)
-            #                   sbase_obj, annot_header, value, units=None, isAlone=False, isList=False, isSort=True, meta_id=None)
-        if inchi:
-            self.addUpdateBRSynth(spe, 'inchi', inchi, None, True, False, False, meta_id)
-        if inchikey:
-            self.addUpdateBRSynth(spe, 'inchikey', inchikey, None, True, False, False, meta_id)
-            self.addUpdateMIRIAM(spe, 'species', {'inchikey': [inchikey]})
+            spe = self.model.createSpecies()
+            self._checklibSBML(spe, 'create species')
+            ##### FBC #####
+            spe_fbc = spe.getPlugin('fbc')
+            self._checklibSBML(spe_fbc, 'creating this species as an instance of FBC')
+            #spe_fbc.setCharge(charge) #### These are not required for FBA
+            #spe_fbc.setChemicalFormula(chemForm) #### These are not required for FBA
+            #if compartment_id:
+            self._checklibSBML(spe.setCompartment(compartment_id), 'set species spe compartment')
+            #else:
+            #    #removing this could lead to errors with xref
+            #    self._checklibSBML(spe.setCompartment(self.compartment_id), 'set species spe compartment')
+            #ID same structure as cobrapy
+            #TODO: determine if this is always the case or it will change
+            self._checklibSBML(spe.setHasOnlySubstanceUnits(False), 'set substance units')
+            self._checklibSBML(spe.setBoundaryCondition(False), 'set boundary conditions')
+            self._checklibSBML(spe.setConstant(False), 'set constant')
+            #useless for FBA (usefull for ODE) but makes Copasi stop complaining
+            self._checklibSBML(spe.setInitialConcentration(1.0), 'set an initial concentration')
+            #same writting convention as COBRApy
+            self._checklibSBML(spe.setId(str(species_id)+'__64__'+str(compartment_id)), 'set species id')
+            self.logger.debug('Setting species id as: '+str(species_id)+'__64__'+str(compartment_id))
+            if meta_id==None:
+                meta_id = self._genMetaID(species_id)
+            self._checklibSBML(spe.setMetaId(meta_id), 'setting reaction meta_id')
+            if species_name==None:
+                self._checklibSBML(spe.setName(species_id), 'setting name for the metabolite '+str(species_id))
+            else:
+                self._checklibSBML(spe.setName(species_name), 'setting name for the metabolite '+str(species_name))
+            #this is setting MNX id as the name
+            #this is setting the name as the input name
+            #self._checklibSBML(spe.setAnnotation(self._defaultBRSynthAnnot(meta_id)), 'creating annotation')
+            self._checklibSBML(spe.setAnnotation(self._defaultBothAnnot(meta_id)), 'creating annotation')
+            ###### annotation ###
+            self.addUpdateMIRIAM(spe, 'species', chemXref, meta_id)
+            ###### BRSYNTH additional information ########
+            if smiles:
+                self.addUpdateBRSynth(spe, 'smiles', smiles, None, True, False, False, meta_id)
+                #                   sbase_obj, annot_header, value, units=None, isAlone=False, isList=False, isSort=True, meta_id=None)
+            if inchi:
+                self.addUpdateBRSynth(spe, 'inchi', inchi, None, True, False, False, meta_id)
+            if inchikey:
+                self.addUpdateBRSynth(spe, 'inchikey', inchikey, None, True, False, False, meta_id)
+                self.addUpdateMIRIAM(spe, 'species', {'inchikey': [inchikey]})
+            if not species_cache is None:
+                species_cache[cache_key] = spe.clone()
         #### GROUPS #####
         #TODO: check that it actually exists
         self.logger.debug('species_group_id: '+str(species_group_id))
@@ -1802,6 +3315,7 @@ class rpSBML:
                 newM = hetero_group.createMember()
                 self._checklibSBML(newM, 'Creating a new groups member')
                 self._checklibSBML(newM.setIdRef(str(species_id)+'__64__'+str(compartment_id)), 'Setting name to the groups member')
+                self.notifyChange('group_member_added', str(species_id)+'__64__'+str(compartment_id), species_group_id)
         #TODO: check that it actually exists
         #add the species to the sink species
         self.logger.debug('in_sink_group_id: '+str(in_sink_group_id))
@@ -1815,6 +3329,8 @@ class rpSBML:
                 newM = sink_group.createMember()
                 self._checklibSBML(newM, 'Creating a new groups member')
                 self._checklibSBML(newM.setIdRef(str(species_id)+'__64__'+str(compartment_id)), 'Setting name to the groups member') 
+                self.notifyChange('group_member_added', str(species_id)+'__64__'+str(compartment_id), in_sink_group_id)
+        self.notifyChange('species_created', str(species_id)+'__64__'+str(compartment_id))
 
 
     #TODO: change the name of this function to createGroup
@@ -1841,6 +3357,7 @@ class rpSBML:
         new_group.setMetaId(meta_id)
         new_group.setKind(libsbml.GROUP_KIND_COLLECTION)
         new_group.setAnnotation(self._defaultBRSynthAnnot(meta_id))
+        self.notifyChange('group_created', pathway_id)
 
 
     def createGene(self, reac, step_id, meta_id=None):
@@ -1870,6 +3387,7 @@ class rpSBML:
         gp.setMetaId(meta_id)
         gp.setLabel('gene_'+str(step_id))
         gp.setAssociatedSpecies('RP'+str(step_id))
+        self.markDirty()
         ##### NOTE: The parameters here require the input from Pablo to determine what he needs
         #gp.setAnnotation(self._defaultBothAnnot(meta_id))
 
@@ -1913,6 +3431,7 @@ class rpSBML:
             meta_id = self._genMetaID(str(fluxobj_id))
         target_flux_obj.setMetaId(meta_id)
         target_flux_obj.setAnnotation(self._defaultBRSynthAnnot(meta_id))
+        self.markDirty()
 
 
     def createMultiFluxObj(self, fluxobj_id, reactionNames, coefficients, isMax=True, meta_id=None):
@@ -1955,6 +3474,7 @@ class rpSBML:
                 meta_id = self._genMetaID(str(fluxobj_id))
             target_flux_obj.setMetaId(meta_id)
             target_flux_obj.setAnnotation(self._defaultBRSynthAnnot(meta_id))
+        self.markDirty()
 
 
     ##############################################################################################
@@ -1972,7 +3492,9 @@ class rpSBML:
         """Generate a generic model
 
         Since we will be using the same type of parameters for the RetroPath model, this function
-        generates a libSBML model with parameters that will be mostly used
+        generates a libSBML model with parameters that will be mostly used. The model is identical for the same
+        compartment and bounds (except for its id and name), so it is only generated the first time and cloned
+        afterwards
         
         :param modelName: The given name of the model
         :param model_id: The id of the model
@@ -1991,6 +3513,16 @@ class rpSBML:
         :rtype: None
         :return: None
         """
+        key = (str(sorted(compXref.items())), compartment_id, float(upper_flux_bound), float(lower_flux_bound))
+        if key in self._generic_models:
+            self.document = self._generic_models[key].clone()
+            self.model = self.document.getModel()
+            self._checklibSBML(self.model.setId(model_id), 'setting the model ID')
+            self._checklibSBML(self.model.setMetaId(self._genMetaID(model_id)), 'setting model meta_id')
+            self._checklibSBML(self.model.setName(modelName), 'setting model name')
+            self._source_path = None
+            self.markDirty()
+            return None
         self.createModel(modelName, model_id)
         # mmol_per_gDW_per_hr -- flux
         unitDef = self.createUnitDefinition('mmol_per_gDW_per_hr')
@@ -2011,4 +3543,5 @@ class rpSBML:
         except KeyError:
             name = compartment_id+'_name'
         self.createCompartment(1, compartment_id, name, compXref)
+        self._generic_models[key] = self.document.clone()
 